@@ -0,0 +1,53 @@
+import argparse
+import json
+import sys
+
+from .requête import requête
+
+
+def formater(résumé) -> str:
+    inf, sup = résumé['hdi']
+    return f"moyenne {résumé['moyenne']:.4g}, ét {résumé['ét']:.4g}, HDI [{inf:.4g}, {sup:.4g}]"
+
+
+def principal(args=None):
+    analyseur = argparse.ArgumentParser(prog="python -m més")
+    sous_analyseurs = analyseur.add_subparsers(dest="commande", required=True)
+
+    a_requête = sous_analyseurs.add_parser(
+        "query", help="Résumer l'effet d'une variable sur une autre selon la dernière calibration disponible"
+    )
+    a_requête.add_argument("modèle")
+    a_requête.add_argument("données")
+    a_requête.add_argument("indépendante")
+    a_requête.add_argument("dépendante")
+    a_requête.add_argument("--racine", default="résultats", help="Dossier des résultats")
+    a_requête.add_argument("--pas-tirages", type=int, help="Ne lire qu'un tirage sur PAS_TIRAGES")
+    a_requête.add_argument("--json", action="store_true", help="Imprimer le résultat en format JSON")
+
+    args = analyseur.parse_args(args)
+
+    if args.commande == "query":
+        try:
+            résultat = requête(
+                args.modèle, args.données, args.indépendante, args.dépendante, racine=args.racine,
+                pas_tirages=args.pas_tirages
+            )
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 1
+        if args.json:
+            print(json.dumps(résultat, ensure_ascii=False, indent=2))
+        else:
+            print(f"{résultat['fichier']} ({résultat['date']})")
+            if not résultat["cheminements"]:
+                print(f"Aucun cheminement de {args.indépendante} à {args.dépendante}.")
+            for c in résultat["cheminements"]:
+                print(" -> ".join(c["cheminement"]) + " : " + formater(c["résumé"]))
+            if len(résultat["cheminements"]) > 1:
+                print("Total : " + formater(résultat["total"]))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(principal())
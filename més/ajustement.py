@@ -0,0 +1,25 @@
+import numpy as np
+
+
+def calculer_ajustement(observées: np.ndarray, prédites: np.ndarray, taille_bloc: int = 100) -> dict[str, np.ndarray]:
+    # observées : (variable, observation) ; prédites : (variable, tirage, observation)
+    observées_c = observées - observées.mean(axis=-1, keepdims=True)
+    somme_carrés_obs = np.einsum('vn,vn->v', observées_c, observées_c)
+
+    n_tirages = prédites.shape[1]
+    r = np.empty(prédites.shape[:2])
+    rmse = np.empty(prédites.shape[:2])
+    for début in range(0, n_tirages, taille_bloc):
+        bloc = prédites[:, début:début + taille_bloc]
+        prédites_c = bloc - bloc.mean(axis=-1, keepdims=True)
+        covariance = np.einsum('vn,vsn->vs', observées_c, prédites_c)
+        somme_carrés_préd = np.einsum('vsn,vsn->vs', prédites_c, prédites_c)
+        r[:, début:début + taille_bloc] = covariance / np.sqrt(somme_carrés_obs[:, None] * somme_carrés_préd)
+
+        erreurs = bloc - observées[:, None, :]
+        rmse[:, début:début + taille_bloc] = np.sqrt(np.einsum('vsn,vsn->vs', erreurs, erreurs) / bloc.shape[-1])
+
+    return {
+        "r2": r.mean(axis=1),
+        "rmse": rmse.mean(axis=1)
+    }
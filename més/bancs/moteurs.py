@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from typing import Optional, TYPE_CHECKING
+
+import arviz as az
+import numpy as np
+
+from ..moteurs import MOTEURS, MOTEURS_VARIATIONNELS
+
+if TYPE_CHECKING:
+    from ..données import Données
+    from ..modèle import Modèle
+
+
+def comparer_moteurs(
+        modèle: Modèle,
+        données: Données,
+        moteurs: Optional[list[str]] = None,
+        cœurs: Optional[int] = None,
+        **options
+) -> dict[str, dict[str, dict[str, float]]]:
+    # Les tirages des moteurs variationnels sont indépendants par construction ; leur nombre effectif de tirages ne
+    # dit rien de la qualité de l'approximation et n'est donc pas comparable à celui des moteurs NUTS
+    résultats = {"nuts": {}, "variationnels": {}}
+    for moteur in moteurs or MOTEURS:
+        variationnel = moteur in MOTEURS_VARIATIONNELS
+        catégorie = résultats["variationnels" if variationnel else "nuts"]
+        mod = modèle.appliquer(données, moteur=moteur, **options)
+        try:
+            trace = mod.échantillonner(cœurs=cœurs)
+        except ImportError as é:
+            catégorie[moteur] = {"erreur": str(é)}
+            continue
+        # Seule la phase d'échantillonnage est chronométrée, sans préparation des données ni construction du modèle
+        durée = mod.profil.phases["échantillonnage"]["durée"]
+
+        if variationnel:
+            n_tirages = trace.posterior.sizes["chain"] * trace.posterior.sizes["draw"]
+            catégorie[moteur] = {"durée": durée, "tirages_par_seconde": float(n_tirages / durée)}
+            continue
+
+        # Nombre effectif de tirages pour les coefficients des relations
+        ess = az.ess(trace, var_names=["rel_"], filter_vars="like")
+        valeurs_ess = np.array([float(ess[v].min()) for v in ess.data_vars])
+        catégorie[moteur] = {
+            "durée": durée,
+            "ess_min": float(valeurs_ess.min()),
+            "ess_médiane": float(np.median(valeurs_ess)),
+            "ess_par_seconde": float(valeurs_ess.min() / durée)
+        }
+
+    return résultats
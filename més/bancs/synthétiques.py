@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from ..données import Données
+from ..effets import résumer_distribution
+from ..graphe import GrapheCausal
+from ..modèle import Modèle
+from ..scénarios import disjonctif
+from ..variables import (
+    GroupeVars, Variable, VariableBooléenne, VariableCatégorique, VariableContinue, VariablePositive, VariableÉchelle
+)
+from ..variables.continues import VariableBornée
+from ..variables.variable import nom_coefficient_relation
+
+N_CATÉGORIES_ÉCHELLE = 4
+N_NIVEAUX_CATÉGORIQUE = 3
+N_RÉGIONS = 10
+
+
+def dag_aléatoire(
+        n_variables: int,
+        profondeur: int,
+        densité: float = 0.5,
+        graine: Optional[int] = None,
+        nom: str = "synthétique"
+) -> tuple[Modèle, dict[tuple[str, str], float]]:
+    générateur = np.random.default_rng(graine)
+    profondeur = max(1, min(profondeur, n_variables))
+
+    classes = [
+        lambda n: VariableContinue(n),
+        lambda n: VariableBooléenne(n),
+        lambda n: VariableÉchelle(n, N_CATÉGORIES_ÉCHELLE)
+    ]
+    variables = [classes[générateur.integers(len(classes))](f"x{i}") for i in range(n_variables)]
+    # Chaque niveau du graphe a au moins une variable
+    niveaux = np.sort(np.concatenate([
+        np.arange(profondeur), générateur.integers(profondeur, size=n_variables - profondeur)
+    ]))
+
+    modèle = Modèle(nom)
+    coefficients = {}
+    with modèle:
+        for i, v in enumerate(variables):
+            if niveaux[i] == 0:
+                continue
+            candidates = [p for j, p in enumerate(variables) if niveaux[j] < niveaux[i]]
+            parents = [p for p in candidates if générateur.random() < densité]
+            if not any(niveaux[variables.index(p)] == niveaux[i] - 1 for p in parents):
+                précédentes = [p for j, p in enumerate(variables) if niveaux[j] == niveaux[i] - 1]
+                parents.append(précédentes[générateur.integers(len(précédentes))])
+            for p in parents:
+                v.dépend_de(p)
+                coefficients[(str(p), str(v))] = float(générateur.normal(0, 0.5))
+
+    return modèle, coefficients
+
+
+def résoudre_synthétique(variable: Union[GroupeVars, Variable]) -> Variable:
+    # Pour un groupe, on simule sa première variable
+    return variable if isinstance(variable, Variable) else next(iter(variable))
+
+
+def simuler_données(
+        modèle: Modèle,
+        n: int,
+        coefficients: Optional[dict[tuple[str, str], Union[float, np.ndarray]]] = None,
+        graine: Optional[int] = None
+) -> tuple[pd.DataFrame, dict[str, Variable], dict[str, Union[float, np.ndarray]]]:
+    # Simule les données selon les coefficients connus et retourne aussi les coefficients attendus sur l'échelle
+    # des données préparées (les variables continues sont normalisées avant la calibration). Chaque variable est
+    # simulée selon sa fonction de lien ; les coefficients ont la forme (colonnes du parent, sorties de la variable),
+    # où les variables catégoriques ont une colonne (ou sortie) par niveau autre que celui de référence.
+    générateur = np.random.default_rng(graine)
+    graphe = GrapheCausal(modèle.relations, résoudre_synthétique)
+    formes = {(str(de), str(à)): (_n_colonnes(de), _n_colonnes(à)) for de, à in graphe.relations}
+    if coefficients is None:
+        coefficients = {r: générateur.normal(0, 0.5, size=forme) for r, forme in formes.items()}
+    coefficients = {r: np.broadcast_to(np.asarray(coefficients[r], dtype=float), forme) for r, forme in formes.items()}
+
+    brutes: dict[str, np.ndarray] = {}
+    conceptions: dict[str, np.ndarray] = {}
+    attendus: dict[str, Union[float, np.ndarray]] = {}
+    for v in graphe.ordre:
+        parents = graphe.parents[str(v)]
+        eta = sum(
+            (conceptions[str(p)] @ coefficients[(str(p), str(v))] for p in parents), np.zeros((n, _n_colonnes(v)))
+        )
+        brutes[str(v)], échelle = _simuler_variable(v, eta, générateur)
+
+        préparées = np.asarray(v.préparer_données(pd.Series(brutes[str(v)])))
+        if isinstance(v, VariableCatégorique):
+            # Mêmes colonnes que la matrice de conception du modèle (ConceptionCatégorique)
+            disjonctives = disjonctif(préparées, N_NIVEAUX_CATÉGORIQUE)
+            référence = disjonctives[:, :1] if v.codage == "effets" else 0
+            conceptions[str(v)] = disjonctives[:, 1:] - référence
+        else:
+            conceptions[str(v)] = préparées.astype(float)[:, None]
+        for p in parents:
+            # Les coefficients du modèle n'ont pas de dimension pour les parents ou variables non catégoriques
+            attendu = coefficients[(str(p), str(v))] / échelle
+            attendu = attendu[:, 0] if not isinstance(v, VariableCatégorique) else attendu
+            attendu = attendu[0] if not isinstance(p, VariableCatégorique) else attendu
+            attendus[nom_coefficient_relation(p, v)] = float(attendu) if np.ndim(attendu) == 0 else np.array(attendu)
+
+    tableau = pd.DataFrame(brutes)
+    tableau["région"] = générateur.integers(N_RÉGIONS, size=n)
+    return tableau, {str(v): v for v in graphe.variables}, attendus
+
+
+def _n_colonnes(variable: Variable) -> int:
+    return N_NIVEAUX_CATÉGORIQUE - 1 if isinstance(variable, VariableCatégorique) else 1
+
+
+def _simuler_variable(
+        variable: Variable, eta: np.ndarray, générateur: np.random.Generator
+) -> tuple[np.ndarray, float]:
+    # Retourne les données brutes et l'échelle par laquelle la préparation des données divise les coefficients
+    n = len(eta)
+    if isinstance(variable, VariableCatégorique):
+        # Logit multinomial ; le niveau 0 est la référence
+        logits = np.concatenate([np.zeros((n, 1)), eta], axis=1)
+        return np.argmax(logits + générateur.gumbel(size=logits.shape), axis=1), 1
+    eta = eta[:, 0]
+    if isinstance(variable, VariableBooléenne):
+        return (générateur.random(n) < 1 / (1 + np.exp(-eta))).astype(int), 1
+    if isinstance(variable, VariableÉchelle):
+        divisions = np.linspace(-1.5, 1.5, (variable.n_catégories or N_CATÉGORIES_ÉCHELLE) - 1)
+        bruit = générateur.logistic(size=n)
+        return ((eta + bruit)[:, None] > divisions[None, :]).sum(axis=1), 1
+    if isinstance(variable, VariablePositive):
+        # Loi log-normale ; la préparation (division par l'écart-type, plus 0.01) ne change le logarithme des données
+        # que d'une constante, à peu près
+        return np.exp(eta + générateur.normal(0, 1, size=n)), 1
+    if isinstance(variable, VariableBornée):
+        # Loi logit-normale entre les bornes de la variable ; sans bornes spécifiées, la préparation utilise les
+        # extrêmes des données, et les coefficients attendus ne sont qu'approximatifs
+        minimum, maximum = variable.obt_bornes(None)
+        return minimum + (maximum - minimum) / (1 + np.exp(-(eta + générateur.normal(0, 1, size=n)))), 1
+    if isinstance(variable, VariableContinue):
+        brutes = eta + générateur.normal(0, 1, size=n)
+        return brutes, float(np.std(brutes, ddof=1))
+    raise TypeError(f"Type de variable {type(variable).__name__} non pris en charge pour la simulation.")
+
+
+def récupération_paramètres(
+        trace, attendus: dict[str, Union[float, np.ndarray]], prob_hdi: float = 0.94
+) -> dict[str, Any]:
+    erreurs = []
+    couverts = 0
+    for coefficient, valeur in attendus.items():
+        # Un élément par niveau pour les coefficients des variables catégoriques
+        tirages = trace.posterior[coefficient].values
+        tirages = tirages.reshape(tirages.shape[0] * tirages.shape[1], -1)
+        for k, x in enumerate(np.ravel(valeur)):
+            résumé = résumer_distribution(tirages[:, k].copy(), prob_hdi=prob_hdi)
+            erreurs.append(résumé["moyenne"] - x)
+            couverts += résumé["hdi"][0] <= x <= résumé["hdi"][1]
+    erreurs = np.array(erreurs)
+    return {
+        "eqm": float(np.sqrt(np.mean(erreurs ** 2))) if len(erreurs) else None,
+        "erreur_max": float(np.max(np.abs(erreurs))) if len(erreurs) else None,
+        "couverture_hdi": couverts / len(erreurs) if len(erreurs) else None
+    }
+
+
+def profondeur_graphe(graphe: GrapheCausal) -> int:
+    # Nombre de niveaux du graphe, comme la `profondeur` de dag_aléatoire
+    niveaux: dict[str, int] = {}
+    for v in graphe.ordre:
+        niveaux[str(v)] = max((niveaux[str(p)] + 1 for p in graphe.parents[str(v)]), default=0)
+    return max(niveaux.values(), default=-1) + 1
+
+
+def chronométrer(f: Callable[[], Any]) -> tuple[float, Any]:
+    début = time.perf_counter()
+    résultat = f()
+    return time.perf_counter() - début, résultat
+
+
+@contextmanager
+def dans_dossier(dossier: str):
+    # Les résultats (calibrations, figures) sont écrits relativement au dossier de travail
+    avant = os.getcwd()
+    os.makedirs(dossier, exist_ok=True)
+    os.chdir(dossier)
+    try:
+        yield
+    finally:
+        os.chdir(avant)
+
+
+def banc_essai(
+        tailles: Sequence[int] = (1000, 10000),
+        n_variables: Sequence[int] = (5, 10),
+        profondeurs: Sequence[int] = (2, 4),
+        graine: int = 0,
+        figures: bool = False,
+        dossier: Optional[str] = None,
+        fichier_sortie: Optional[str] = None,
+        modèle: Optional[Modèle] = None,
+        **options
+) -> dict[str, Any]:
+    # Avec `modèle`, on simule des données selon sa structure au lieu de graphes aléatoires de `n_variables` variables
+    # et de `profondeurs` niveaux
+    dossier = dossier or tempfile.mkdtemp(prefix="banc_més_")
+    if modèle is not None:
+        configurations = [(modèle.nom, modèle, None)]
+    else:
+        configurations = [
+            (f"synthétique_{n_vars}_{profondeur}", *dag_aléatoire(n_vars, profondeur, graine=graine))
+            for n_vars in n_variables for profondeur in profondeurs
+        ]
+    résultats = []
+
+    with dans_dossier(dossier):
+        for nom_configuration, modèle_banc, coefficients in configurations:
+            for n in tailles:
+                tableau, variables, attendus = simuler_données(modèle_banc, n, coefficients, graine=graine)
+                nom = f"{nom_configuration}_{n}"
+                fichier_csv = nom + ".csv"
+                tableau.to_csv(fichier_csv, index=False)
+
+                def ingérer():
+                    d = Données(
+                        nom, fichier_csv, colonnes_var=variables, col_région="région", dossier_cache=None
+                    )
+                    d.préparées()
+                    return d
+
+                durées = {}
+                durées["ingestion"], données = chronométrer(ingérer)
+                mod = modèle_banc.appliquer(données, graine=graine, **options)
+                durées["calibrer"], _ = chronométrer(mod.calibrer)
+                trace = mod.obtenir_calibration()
+
+                graphe = mod.graphe
+                # Les impactes ne sont définis que pour des cheminements sans variable catégorique
+                simples = [v for v in graphe.ordre if not isinstance(v, VariableCatégorique)]
+                racine, feuille = simples[0], simples[-1]
+                durées["cheminements"], cheminements = chronométrer(lambda: mod.cheminements(feuille, racine))
+                if not any(isinstance(v, VariableCatégorique) for c in cheminements for v in c):
+                    durées["impacte"], _ = chronométrer(lambda: mod.impacte(feuille, racine))
+                if figures:
+                    durées["dessiner_impacte"], _ = chronométrer(mod.dessiner_impacte)
+
+                résultats.append({
+                    "configuration": nom_configuration,
+                    "n": n,
+                    "n_variables": len(graphe),
+                    "profondeur": profondeur_graphe(graphe),
+                    "n_relations": len(graphe.relations),
+                    "durées": durées,
+                    "profil": mod.profil.phases,
+                    "diagnostics": mod.profil.diagnostics,
+                    "récupération": récupération_paramètres(trace, attendus)
+                })
+
+    rapport = {
+        "date": datetime.now().isoformat(),
+        "plateforme": platform.platform(),
+        "python": platform.python_version(),
+        "options": options,
+        "résultats": résultats
+    }
+    if fichier_sortie:
+        with open(fichier_sortie, 'w', encoding='utf8') as d:
+            json.dump(rapport, d, ensure_ascii=False, indent=2, default=str)
+    return rapport
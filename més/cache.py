@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, TYPE_CHECKING
+
+from .stockage import lire_calibration
+
+if TYPE_CHECKING:
+    import arviz as az
+
+TAILLE_MAX_CACHE = 2 * 1024 ** 3
+
+
+def charger_calibration(fichier: str) -> tuple[az.InferenceData, Optional[Any]]:
+    return lire_calibration(fichier)
+
+
+def taille_en_mémoire(calibration: az.InferenceData) -> int:
+    return sum(
+        v.nbytes for g in calibration.groups() for v in calibration[g].variables.values() if v._in_memory
+    )
+
+
+class CacheCalibrations(object):
+    def __init__(soimême, taille_max: int = TAILLE_MAX_CACHE):
+        soimême.taille_max = taille_max
+        soimême._calibrations: OrderedDict[tuple[str, float], az.InferenceData] = OrderedDict()
+        # Magasins Zarr encore ouverts, à fermer avec leur calibration
+        soimême._magasins: dict[tuple[str, float], Any] = {}
+        soimême._verrou = threading.RLock()
+
+    def obtenir(soimême, fichier: str) -> az.InferenceData:
+        fichier = os.path.abspath(fichier)
+        clé = (fichier, os.path.getmtime(fichier))
+
+        with soimême._verrou:
+            if clé in soimême._calibrations:
+                soimême._calibrations.move_to_end(clé)
+                soimême._réduire()
+                return soimême._calibrations[clé]
+
+            soimême.retirer(fichier)
+
+            calibration, magasin = charger_calibration(fichier)
+            soimême._calibrations[clé] = calibration
+            if magasin is not None:
+                soimême._magasins[clé] = magasin
+            soimême._réduire()
+            return calibration
+
+    def retirer(soimême, fichier: str):
+        fichier = os.path.abspath(fichier)
+        with soimême._verrou:
+            for c in [c for c in soimême._calibrations if c[0] == fichier]:
+                soimême._oublier(c)
+
+    def vider(soimême):
+        with soimême._verrou:
+            for c in list(soimême._calibrations):
+                soimême._oublier(c)
+
+    def taille(soimême) -> int:
+        return sum(taille_en_mémoire(c) for c in soimême._calibrations.values())
+
+    def _réduire(soimême):
+        # On garde toujours la calibration la plus récemment utilisée
+        while len(soimême._calibrations) > 1 and soimême.taille() > soimême.taille_max:
+            soimême._oublier(next(iter(soimême._calibrations)))
+
+    def _oublier(soimême, clé: tuple[str, float]):
+        calibration = soimême._calibrations.pop(clé)
+        for g in calibration.groups():
+            calibration[g].close()
+        magasin = soimême._magasins.pop(clé, None)
+        if magasin is not None:
+            magasin.close()
+
+    def __contains__(soimême, fichier: str):
+        fichier = os.path.abspath(fichier)
+        return any(c[0] == fichier for c in soimême._calibrations)
+
+    def __len__(soimême):
+        return len(soimême._calibrations)
+
+
+cache_calibrations = CacheCalibrations()
@@ -1,9 +1,19 @@
-from typing import Optional, Union
+import hashlib
+import json
+import os
+from typing import Optional, Union, Iterable
 
+import numpy as np
 import pandas as pd
-import xarray as xr
 
-from .variables import Variable
+from .variables import Variable, VariableCatégorique
+
+TAILLE_MORCEAUX = 100000
+DOSSIER_CACHE_DONNÉES = os.path.join('résultats', 'données')
+CLÉ_CODES_RÉGIONS = '__codes_régions__'
+CLÉ_NOMS_RÉGIONS = '__noms_régions__'
+# À incrémenter lorsque le contenu du cache des données préparées change (p. ex., ajout des codes de région)
+VERSION_CACHE_DONNÉES = 2
 
 
 class Données(object):
@@ -14,34 +24,327 @@ class Données(object):
             colonnes_var: dict[str, Union[str, Variable]],
             col_région: str,
             année: Optional[int] = None,
-            forme_sig: Optional[str] = None
+            forme_sig: Optional[str] = None,
+            taille_morceaux: int = TAILLE_MORCEAUX,
+            dossier_cache: Optional[str] = DOSSIER_CACHE_DONNÉES
     ):
         soimême.nom = nom
         soimême.colonnes_var = colonnes_var
         soimême.col_région = col_région
         soimême.année = année
         soimême.forme_sig = forme_sig
+        soimême.taille_morceaux = taille_morceaux
+        soimême.dossier_cache = dossier_cache
+
+        soimême._source = données
+        soimême._index = {str(v): c for c, v in colonnes_var.items()}
+        soimême._données_pd: Optional[pd.DataFrame] = None
+        soimême._préparées: Optional[dict[str, np.ndarray]] = None
+        soimême._empreintes_préparées: dict[str, str] = {}
 
+    @property
+    def données_pd(soimême) -> pd.DataFrame:
+        # Les données brutes ne sont lues que si les données préparées ne sont pas déjà en cache
+        if soimême._données_pd is None:
+            soimême._données_pd = soimême._lire()
+        return soimême._données_pd
+
+    def _lire(soimême) -> pd.DataFrame:
+        données = soimême._source
+        colonnes = list(soimême.colonnes_var.keys())
         if isinstance(données, pd.DataFrame):
-            soimême.données_pd = données
+            disponibles = données.columns
         else:
-            ext = données.split(".")[1]
-            if ext == 'dta':
-                soimême.données_pd = pd.read_stata(données)
-            elif ext == 'csv':
-                soimême.données_pd = pd.read_csv(données)
-            elif ext == 'nc':
-                soimême.données_pd = xr.open_dataset(données).to_dataframe()
+            disponibles = colonnes_disponibles(données)
+        # On ne lit que les colonnes des variables et, si elle existe, celle de la région
+        colonnes_lues = colonnes + [c for c in [soimême.col_région] if c in disponibles and c not in colonnes]
+
+        if isinstance(données, pd.DataFrame):
+            return réduire_types(données.loc[:, colonnes_lues].dropna(subset=colonnes))
+        return lire_données(données, colonnes_lues, colonnes, soimême.taille_morceaux)
+
+    def obtenir(soimême, variable: Variable) -> np.ndarray:
+        return soimême.préparées()[str(variable)]
+
+    def brutes(soimême, variable: Variable) -> pd.Series:
+        # Valeurs avant préparation, dans le même ordre que celles d'`obtenir`
+        return soimême.données_pd[soimême._index[str(variable)]]
+
+    def transformer(soimême, variable: Variable, valeurs: pd.Series) -> np.ndarray:
+        # Valeurs brutes (indexées comme `brutes`) transformées sur la même échelle que les données préparées
+        return np.asarray(variable.transformer(valeurs, soimême.brutes(variable)))
+
+    def préparées(soimême) -> dict[str, np.ndarray]:
+        if soimême._préparées is None:
+            dossier = soimême._dossier_préparées()
+            if dossier is not None and os.path.isfile(os.path.join(dossier, 'index.json')):
+                soimême._préparées, soimême._empreintes_préparées = charger_préparées(dossier)
             else:
-                raise ValueError(données)
+                soimême._préparées = soimême._préparer()
+                soimême._empreintes_préparées = {
+                    v: hashlib.sha256(x.tobytes()).hexdigest() for v, x in soimême._préparées.items()
+                }
+                if dossier is not None:
+                    sauvegarder_préparées(dossier, soimême._préparées, soimême._empreintes_préparées)
+        return soimême._préparées
+
+    def _préparer(soimême) -> dict[str, np.ndarray]:
+        préparées = {}
+        for c, v in soimême.colonnes_var.items():
+            col = soimême.données_pd[c]
+            if isinstance(v, Variable):
+                col = v.préparer_données(col)
+            préparées[str(v)] = np.ascontiguousarray(np.asarray(col))
+
+        if soimême.col_région in soimême.données_pd.columns:
+            codes, noms = pd.factorize(soimême.données_pd[soimême.col_région], use_na_sentinel=False)
+            préparées[CLÉ_CODES_RÉGIONS] = codes.astype(np.int32)
+            préparées[CLÉ_NOMS_RÉGIONS] = np.asarray([str(n) for n in noms], dtype=str)
+        return préparées
+
+    def régions(soimême) -> tuple[np.ndarray, np.ndarray]:
+        préparées = soimême.préparées()
+        if CLÉ_CODES_RÉGIONS not in préparées:
+            raise ValueError(f"Colonne de région {soimême.col_région} absente des données {soimême.nom}.")
+        return préparées[CLÉ_CODES_RÉGIONS], préparées[CLÉ_NOMS_RÉGIONS]
+
+    def _dossier_préparées(soimême) -> Optional[str]:
+        if soimême.dossier_cache is None:
+            return None
+        configuration = {
+            c: v.configuration() if isinstance(v, Variable) else v for c, v in soimême.colonnes_var.items()
+        }
+        clé = hashlib.sha256(
+            (empreinte_source(soimême._source, soimême.dossier_cache) + json.dumps(
+                {"colonnes": configuration, "col_région": soimême.col_région, "version": VERSION_CACHE_DONNÉES},
+                sort_keys=True, default=str
+            )).encode()
+        ).hexdigest()
+        return os.path.join(soimême.dossier_cache, f"{soimême.nom}_{clé[:16]}")
+
+    def __contains__(soimême, variable):
+        return str(variable) in soimême._index
+
+    def __getstate__(soimême):
+        # Les données lues et préparées ne sont pas envoyées aux sous-processus, qui les relisent du cache sur le disque
+        # (ou les préparent eux-mêmes)
+        return {**soimême.__dict__, "_données_pd": None, "_préparées": None}
+
+    def empreinte(soimême, variables: Iterable[Variable]) -> str:
+        soimême.préparées()
+        empreinte = hashlib.sha256()
+        for v in sorted(variables, key=str):
+            empreinte.update(json.dumps(v.configuration(), sort_keys=True, default=str).encode())
+            empreinte.update(soimême._empreintes_préparées[str(v)].encode())
+        empreinte.update(soimême._empreintes_préparées.get(CLÉ_CODES_RÉGIONS, '').encode())
+        return empreinte.hexdigest()
+
+
+class DonnéesGroupées(object):
+    def __init__(soimême, nom: str, *données: Données):
+        # Plusieurs jeux de données (p. ex., un par pays) empilés dans un seul modèle ; chaque jeu forme un groupe
+        soimême.nom = nom
+        soimême.données = données
+        soimême._préparées: Optional[dict[str, np.ndarray]] = None
+        soimême._longueurs: list[int] = []
+
+    def obtenir(soimême, variable: Variable) -> np.ndarray:
+        return soimême.préparées()[str(variable)]
+
+    def brutes(soimême, variable: Variable) -> pd.Series:
+        return pd.concat([d.brutes(variable) for d in soimême.données], ignore_index=True)
+
+    def transformer(soimême, variable: Variable, valeurs: pd.Series) -> np.ndarray:
+        if isinstance(variable, VariableCatégorique):
+            return np.asarray(variable.transformer(valeurs, soimême.brutes(variable)))
+
+        # Chaque jeu de données est préparé séparément ; on transforme donc les lignes de chacun selon ses propres
+        # valeurs de référence (l'index de `valeurs` est la position dans les données empilées)
+        soimême.préparées()
+        positions = np.asarray(valeurs.index)
+        bornes = np.cumsum([0, *soimême._longueurs])
+        transformées = np.empty(len(valeurs))
+        for i, d in enumerate(soimême.données):
+            dans = (positions >= bornes[i]) & (positions < bornes[i + 1])
+            if dans.any():
+                transformées[dans] = np.asarray(variable.transformer(valeurs[dans], d.brutes(variable)), dtype=float)
+        return transformées
+
+    def préparées(soimême) -> dict[str, np.ndarray]:
+        if soimême._préparées is None:
+            variables = {str(v): v for d in soimême.données for v in d.colonnes_var.values() if isinstance(v, Variable)}
+            communes = [n for n in variables if n in soimême]
+            if not communes:
+                raise ValueError(f"Aucune variable commune à toutes les données de {soimême.nom}.")
+
+            préparées = {}
+            for n in communes:
+                v = variables[n]
+                if isinstance(v, VariableCatégorique):
+                    # Les codes des niveaux doivent être les mêmes pour toutes les données
+                    préparées[n] = np.asarray(v.préparer_données(soimême.brutes(v)))
+                else:
+                    # Les autres variables restent préparées (p. ex., normalisées) séparément pour chaque jeu
+                    préparées[n] = np.concatenate([d.obtenir(v) for d in soimême.données])
+            soimême._longueurs = [len(d.obtenir(variables[communes[0]])) for d in soimême.données]
 
-        soimême.données_pd = soimême.données_pd.loc[:, soimême.colonnes_var.keys()].dropna()
+            if all(CLÉ_CODES_RÉGIONS in d.préparées() for d in soimême.données):
+                codes, noms, décalage = [], [], 0
+                for d in soimême.données:
+                    codes_d, noms_d = d.régions()
+                    codes.append(codes_d + décalage)
+                    noms.extend(f"{d.nom}:{n}" for n in noms_d)
+                    décalage += len(noms_d)
+                préparées[CLÉ_CODES_RÉGIONS] = np.concatenate(codes).astype(np.int32)
+                préparées[CLÉ_NOMS_RÉGIONS] = np.asarray(noms, dtype=str)
+            soimême._préparées = préparées
+        return soimême._préparées
 
-    def obtenir(soimême, variable: Variable):
-        col_variable = next(c for c, v in soimême.colonnes_var.items() if str(variable) == str(v))
-        données = soimême.données_pd[col_variable]
-        données = variable.préparer_données(données)
-        return données
+    def régions(soimême) -> tuple[np.ndarray, np.ndarray]:
+        préparées = soimême.préparées()
+        if CLÉ_CODES_RÉGIONS not in préparées:
+            raise ValueError(f"Colonne de région absente d'au moins un des jeux de données de {soimême.nom}.")
+        return préparées[CLÉ_CODES_RÉGIONS], préparées[CLÉ_NOMS_RÉGIONS]
+
+    def pays(soimême) -> tuple[np.ndarray, np.ndarray]:
+        soimême.préparées()
+        codes = np.repeat(np.arange(len(soimême.données), dtype=np.int32), soimême._longueurs)
+        return codes, np.asarray([d.nom for d in soimême.données], dtype=str)
+
+    def empreinte(soimême, variables: Iterable[Variable]) -> str:
+        variables = list(variables)
+        empreinte = hashlib.sha256()
+        for d in soimême.données:
+            empreinte.update(d.nom.encode())
+            empreinte.update(d.empreinte(variables).encode())
+        return empreinte.hexdigest()
 
     def __contains__(soimême, variable):
-        return str(variable) in [str(v) for v in soimême.colonnes_var.values()]
+        return all(variable in d for d in soimême.données)
+
+    def __getstate__(soimême):
+        return {**soimême.__dict__, "_préparées": None, "_longueurs": []}
+
+
+def empreinte_source(source: Union[str, pd.DataFrame], dossier_cache: str) -> str:
+    if isinstance(source, pd.DataFrame):
+        return hashlib.sha256(pd.util.hash_pandas_object(source, index=False).values.tobytes()).hexdigest()
+
+    # On garde en mémoire l'empreinte du fichier source pour ne pas le relire tant qu'il n'a pas changé
+    fichier_empreintes = os.path.join(dossier_cache, 'empreintes_sources.json')
+    empreintes = {}
+    if os.path.isfile(fichier_empreintes):
+        with open(fichier_empreintes, encoding='utf8') as d:
+            empreintes = json.load(d)
+
+    stat = os.stat(source)
+    clé = f"{os.path.abspath(source)}|{stat.st_size}|{stat.st_mtime_ns}"
+    if clé not in empreintes:
+        empreinte = hashlib.sha256()
+        with open(source, 'rb') as d:
+            for bloc in iter(lambda: d.read(2 ** 24), b''):
+                empreinte.update(bloc)
+        empreintes[clé] = empreinte.hexdigest()
+
+        os.makedirs(dossier_cache, exist_ok=True)
+        temporaire = fichier_empreintes + f'.{os.getpid()}'
+        with open(temporaire, 'w', encoding='utf8') as d:
+            json.dump(empreintes, d, ensure_ascii=False, indent=2)
+        os.replace(temporaire, fichier_empreintes)
+
+    return empreintes[clé]
+
+
+def charger_préparées(dossier: str) -> tuple[dict[str, np.ndarray], dict[str, str]]:
+    with open(os.path.join(dossier, 'index.json'), encoding='utf8') as d:
+        index = json.load(d)
+    préparées = {
+        v: np.load(os.path.join(dossier, info["fichier"]), mmap_mode='r', allow_pickle=False)
+        for v, info in index.items()
+    }
+    return préparées, {v: info["empreinte"] for v, info in index.items()}
+
+
+def sauvegarder_préparées(dossier: str, préparées: dict[str, np.ndarray], empreintes: dict[str, str]):
+    os.makedirs(dossier, exist_ok=True)
+    index = {}
+    for i, (v, x) in enumerate(préparées.items()):
+        if x.dtype == object:
+            continue  # Ne peut pas être lu en mmap
+        fichier = f"{i}.npy"
+        np.save(os.path.join(dossier, fichier), x, allow_pickle=False)
+        index[v] = {"fichier": fichier, "empreinte": empreintes[v]}
+
+    # L'index est écrit en dernier pour qu'un cache incomplet ne soit jamais lu
+    if len(index) == len(préparées):
+        with open(os.path.join(dossier, 'index.json'), 'w', encoding='utf8') as d:
+            json.dump(index, d, ensure_ascii=False, indent=2)
+
+
+def extension(fichier: str) -> str:
+    return os.path.splitext(fichier)[1].lstrip('.').lower()
+
+
+def colonnes_disponibles(fichier: str) -> list[str]:
+    import xarray as xr
+
+    ext = extension(fichier)
+    if ext == 'dta':
+        with pd.read_stata(fichier, chunksize=1) as lecteur:
+            return list(next(iter(lecteur)).columns)
+    elif ext == 'csv':
+        return list(pd.read_csv(fichier, nrows=0).columns)
+    elif ext == 'nc':
+        with xr.open_dataset(fichier) as d:
+            return list(d.variables)
+    elif ext in ['parquet', 'pq']:
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(fichier).schema_arrow.names
+    elif ext in ['feather', 'arrow']:
+        import pyarrow.ipc as ipc
+        with ipc.open_file(fichier) as lecteur:
+            return lecteur.schema.names
+    raise ValueError(fichier)
+
+
+def lire_données(fichier: str, colonnes: list[str], colonnes_var: list[str], taille_morceaux: int) -> pd.DataFrame:
+    import xarray as xr
+
+    ext = extension(fichier)
+    if ext == 'dta':
+        morceaux = pd.read_stata(fichier, columns=colonnes, chunksize=taille_morceaux)
+    elif ext == 'csv':
+        morceaux = pd.read_csv(fichier, usecols=colonnes, chunksize=taille_morceaux)
+    elif ext == 'nc':
+        # Sélectionner les variables avant de convertir en tableau ; les colonnes qui sont des dimensions (p. ex., la
+        # région) se retrouvent dans l'index et doivent en être ressorties
+        with xr.open_dataset(fichier) as d:
+            morceaux = [d[colonnes].to_dataframe().reset_index()]
+    elif ext in ['parquet', 'pq']:
+        morceaux = [pd.read_parquet(fichier, columns=colonnes)]
+    elif ext in ['feather', 'arrow']:
+        morceaux = [pd.read_feather(fichier, columns=colonnes)]
+    else:
+        raise ValueError(fichier)
+
+    if isinstance(morceaux, list):
+        return réduire_types(morceaux[0].loc[:, colonnes].dropna(subset=colonnes_var))
+
+    with morceaux as lecteur:
+        données = pd.concat(
+            [réduire_types(m.dropna(subset=colonnes_var)) for m in lecteur], ignore_index=True
+        )
+    return réduire_types(données)
+
+
+def réduire_types(données: pd.DataFrame) -> pd.DataFrame:
+    données = données.copy()
+    for c in données.columns:
+        col = données[c]
+        if pd.api.types.is_float_dtype(col):
+            données[c] = pd.to_numeric(col, downcast='float')
+        elif pd.api.types.is_integer_dtype(col):
+            données[c] = pd.to_numeric(col, downcast='integer')
+        elif pd.api.types.is_object_dtype(col):
+            données[c] = col.astype('category')
+    return données
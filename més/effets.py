@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from typing import Sequence, TypedDict, TYPE_CHECKING
+
+import numpy as np
+
+from .variables.variable import nom_coefficient_relation
+
+if TYPE_CHECKING:
+    import arviz as az
+    from .graphe import GrapheCausal
+    from .variables import Variable
+
+
+class Effets(TypedDict):
+    variables: list[Variable]
+    directs: np.ndarray
+    indirects: np.ndarray
+    totaux: np.ndarray
+
+
+class RésuméDistribution(TypedDict):
+    moyenne: float
+    ét: float
+    quantiles: dict[float, float]
+    hdi: tuple[float, float]
+    prob_positif: float
+
+
+def résumer_distribution(
+        valeurs: np.ndarray,
+        quantiles: Sequence[float] = (0.025, 0.5, 0.975),
+        prob_hdi: float = 0.94
+) -> RésuméDistribution:
+    # Attention : `valeurs` est triée sur place
+    n = valeurs.size
+    moyenne = float(valeurs.mean())
+    ét = float(valeurs.std())
+    prob_positif = np.count_nonzero(valeurs > 0) / n
+
+    valeurs.sort()
+    n_intervalle = max(1, min(n, int(np.floor(prob_hdi * n))))
+    largeurs = valeurs[n_intervalle - 1:] - valeurs[:n - n_intervalle + 1]
+    i_hdi = int(np.argmin(largeurs))
+
+    return RésuméDistribution(
+        moyenne=moyenne,
+        ét=ét,
+        quantiles={q: float(x) for q, x in zip(quantiles, np.quantile(valeurs, quantiles))},
+        hdi=(float(valeurs[i_hdi]), float(valeurs[i_hdi + n_intervalle - 1])),
+        prob_positif=prob_positif
+    )
+
+
+def matrice_coefficients(trace: az.InferenceData, graphe: GrapheCausal) -> np.ndarray:
+    # B[..., i, j] est le coefficient de la relation de la variable i envers la variable j
+    postérieur = trace.posterior
+    n_variables = len(graphe)
+    matrice = np.zeros((postérieur.sizes["chain"], postérieur.sizes["draw"], n_variables, n_variables))
+    for de, à in graphe.relations:
+        coefficient = postérieur[nom_coefficient_relation(de, à)]
+        if coefficient.ndim > 2:
+            raise ValueError(
+                f"Le coefficient {coefficient.name} a une valeur par niveau (variable catégorique) et ne peut être "
+                f"représenté dans la matrice d'adjacence. Utilisez plutôt ModèleCalibré.scénarios."
+            )
+        matrice[..., graphe.index[str(de)], graphe.index[str(à)]] = coefficient.values
+    return matrice
+
+
+def calculer_effets(trace: az.InferenceData, graphe: GrapheCausal) -> Effets:
+    directs = matrice_coefficients(trace, graphe)
+
+    # Pour un graphe acyclique, (I - B)⁻¹ = I + B + B² + ..., soit la somme des produits sur tous les cheminements
+    identité = np.eye(len(graphe))
+    totaux = np.linalg.solve(identité - directs, np.broadcast_to(identité, directs.shape)) - identité
+
+    return Effets(
+        variables=list(graphe.variables),
+        directs=directs,
+        indirects=totaux - directs,
+        totaux=totaux
+    )
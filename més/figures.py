@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Optional
+
+_portée_kaleido = None
+
+
+def exporter_image(figure: Any, fichier: str, scale: float = 4):
+    # Un seul processus Kaleido (Chromium) est lancé et réutilisé pour toutes les exportations
+    global _portée_kaleido
+    if _portée_kaleido is None:
+        from kaleido.scopes.plotly import PlotlyScope
+        _portée_kaleido = PlotlyScope()
+
+    format_image = os.path.splitext(fichier)[1].lstrip('.').lower() or 'png'
+    image = _portée_kaleido.transform(figure, format='jpg' if format_image == 'jpeg' else format_image, scale=scale)
+    with open(fichier, 'wb') as d:
+        d.write(image)
+
+
+def dessiner_traces_variables(fichier_calibs: str, variables: list[str], fichiers: list[str], titre: str):
+    # Peut être exécutée dans un processus séparé ; la calibration est alors relue paresseusement
+    import arviz as az
+    import matplotlib.pyplot as plt
+
+    from .cache import cache_calibrations
+
+    trace = cache_calibrations.obtenir(fichier_calibs)
+    for v, fichier in zip(variables, fichiers):
+        az.plot_trace(trace, [v])
+        fig = plt.gcf()
+        fig.suptitle(f"{titre}, {v}")
+        fig.savefig(fichier)
+        plt.close(fig)
+
+
+def dessiner_traces_processus(fichier_calibs: str, variables: list[str], fichiers: list[str], titre: str):
+    # Dans un sous-processus, sans interface graphique ; le moteur de matplotlib de l'utilisateur n'est pas touché
+    import matplotlib
+    matplotlib.use("Agg")
+
+    dessiner_traces_variables(fichier_calibs, variables, fichiers, titre)
+
+
+class EmpreintesFigures(object):
+    # Empreintes des calibrations à partir desquelles chaque figure d'un dossier a été générée
+    def __init__(soimême, dossier: str):
+        soimême.fichier = os.path.join(dossier, '.empreintes.json')
+        soimême.empreintes: dict[str, str] = {}
+        if os.path.isfile(soimême.fichier):
+            with open(soimême.fichier, encoding='utf8') as d:
+                soimême.empreintes = json.load(d)
+
+    def à_jour(soimême, fichier_figure: str, empreinte: str) -> bool:
+        return os.path.isfile(fichier_figure) and soimême.empreintes.get(os.path.basename(fichier_figure)) == empreinte
+
+    def marquer(soimême, fichier_figure: str, empreinte: Optional[str]):
+        soimême.empreintes[os.path.basename(fichier_figure)] = empreinte
+
+    def sauvegarder(soimême):
+        with open(soimême.fichier, 'w', encoding='utf8') as d:
+            json.dump(soimême.empreintes, d, ensure_ascii=False, indent=2)
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+from typing import Callable, Union, TYPE_CHECKING
+
+import numpy as np
+
+from .variables.variable import nom_coefficient_relation
+
+if TYPE_CHECKING:
+    import arviz as az
+    from .variables import GroupeVars, Relation, Variable
+
+
+class GrapheCausal(object):
+    def __init__(
+            soimême,
+            relations: list[Relation],
+            résoudre: Callable[[Union[GroupeVars, Variable]], Variable]
+    ):
+        soimême.variables: list[Variable] = []
+        soimême.relations: list[tuple[Variable, Variable]] = []
+        soimême.parents: dict[str, list[Variable]] = {}
+        soimême.enfants: dict[str, list[Variable]] = {}
+
+        for r in relations:
+            indépendante = résoudre(r.indépendante)
+            dépendante = résoudre(r.dépendante)
+            for v in [dépendante, indépendante]:
+                if str(v) not in soimême.parents:
+                    soimême.variables.append(v)
+                    soimême.parents[str(v)] = []
+                    soimême.enfants[str(v)] = []
+            if indépendante not in soimême.parents[str(dépendante)]:
+                soimême.parents[str(dépendante)].append(indépendante)
+                soimême.enfants[str(indépendante)].append(dépendante)
+                soimême.relations.append((indépendante, dépendante))
+
+        soimême.index = {str(v): i for i, v in enumerate(soimême.variables)}
+        soimême.ordre = soimême._ordre_topologique()
+
+    def _ordre_topologique(soimême) -> list[Variable]:
+        n_parents = {str(v): len(soimême.parents[str(v)]) for v in soimême.variables}
+        prêtes = [v for v in soimême.variables if not n_parents[str(v)]]
+        ordre: list[Variable] = []
+        while prêtes:
+            v = prêtes.pop(0)
+            ordre.append(v)
+            for e in soimême.enfants[str(v)]:
+                n_parents[str(e)] -= 1
+                if not n_parents[str(e)]:
+                    prêtes.append(e)
+
+        if len(ordre) < len(soimême.variables):
+            raise ValueError(
+                f"Connexions circulaires : {', '.join([v.nom for v in soimême.variables if v not in ordre])}"
+            )
+        return ordre
+
+    def cheminements(soimême, de: Variable, à: Variable) -> list[list[Variable]]:
+        cheminements: list[list[Variable]] = []
+        if str(de) not in soimême.enfants:
+            return cheminements
+
+        pile = [[de]]
+        while pile:
+            base = pile.pop()
+            if len(base) > 1 and str(base[-1]) == str(à):
+                cheminements.append(base)
+                continue
+            pile.extend([*base, e] for e in reversed(soimême.enfants[str(base[-1])]))
+        return cheminements
+
+    def résumer_coefficients(soimême, trace: az.InferenceData) -> dict[tuple[str, str], dict[str, float]]:
+        résumé = {}
+        for de, à in soimême.relations:
+            valeurs = trace.posterior[nom_coefficient_relation(de, à)].values
+            moyenne = float(np.mean(valeurs))
+            résumé[(str(de), str(à))] = {
+                "moyenne": moyenne,
+                "ét": float(np.std(valeurs)),
+                "force": abs(moyenne)
+            }
+        return résumé
+
+    def __contains__(soimême, variable: Variable):
+        return str(variable) in soimême.index
+
+    def __len__(soimême):
+        return len(soimême.variables)
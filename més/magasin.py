@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterable, Optional
+
+from .stockage import EXTENSIONS_FORMATS, base_fichier
+
+EXTENSIONS_CALIBRATION = tuple(EXTENSIONS_FORMATS.values())
+
+
+class MagasinCalibrations(object):
+    def __init__(soimême, dossier: str):
+        soimême.dossier = dossier
+        soimême.fichier_index = os.path.join(dossier, 'index.json')
+
+    def enregistrer(soimême, empreinte: str, fichier: str, métadonnées: dict[str, Any]):
+        with soimême._verrou():
+            index = soimême._lire_index()
+            index[empreinte] = {
+                **métadonnées,
+                "fichier": os.path.relpath(fichier, soimême.dossier),
+                "date": datetime.now().isoformat()
+            }
+            soimême._écrire_index(index)
+
+    def obtenir(soimême, empreinte: str) -> Optional[dict[str, Any]]:
+        entrée = soimême._lire_index().get(empreinte)
+        if entrée is None or not os.path.isfile(soimême.chemin(entrée)):
+            return None
+        return entrée
+
+    def chercher(soimême, modèle: Optional[str] = None, données: Optional[str] = None) -> dict[str, dict[str, Any]]:
+        return {
+            e: entrée for e, entrée in soimême._lire_index().items()
+            if (modèle is None or entrée.get("modèle") == modèle)
+            and (données is None or entrée.get("données") == données)
+            and os.path.isfile(soimême.chemin(entrée))
+        }
+
+    def chemin(soimême, entrée: dict[str, Any]) -> str:
+        return os.path.join(soimême.dossier, entrée["fichier"])
+
+    def nettoyer(soimême, garder: Optional[Iterable[str]] = None) -> list[str]:
+        # Enlève les entrées dont le fichier n'existe plus, les fichiers de calibration absents de l'index et,
+        # si `garder` est spécifié, toutes les calibrations dont l'empreinte n'en fait pas partie.
+        garder = None if garder is None else set(garder)
+        effacés = []
+        with soimême._verrou():
+            index = soimême._lire_index()
+            for empreinte, entrée in list(index.items()):
+                fichier = soimême.chemin(entrée)
+                if not os.path.isfile(fichier):
+                    index.pop(empreinte)
+                elif garder is not None and empreinte not in garder:
+                    index.pop(empreinte)
+                    os.remove(fichier)
+                    effacés.append(fichier)
+
+            connus = {os.path.abspath(soimême.chemin(e)) for e in index.values()}
+            for racine, _, fichiers in os.walk(soimême.dossier):
+                for f in fichiers:
+                    fichier = os.path.join(racine, f)
+                    if f.endswith(EXTENSIONS_CALIBRATION) and not soimême._est_connu(fichier, connus):
+                        os.remove(fichier)
+                        effacés.append(fichier)
+
+            soimême._écrire_index(index)
+        return effacés
+
+    @staticmethod
+    def _est_connu(fichier: str, connus: set[str]) -> bool:
+        # Les fichiers associés à une calibration (p. ex., prédictions) portent son nom suivi d'un suffixe
+        fichier = os.path.abspath(fichier)
+        return fichier in connus or any(fichier.startswith(base_fichier(c) + '.') for c in connus)
+
+    def _lire_index(soimême) -> dict[str, dict[str, Any]]:
+        if not os.path.isfile(soimême.fichier_index):
+            return {}
+        with open(soimême.fichier_index, encoding='utf8') as d:
+            return json.load(d)
+
+    def _écrire_index(soimême, index: dict[str, dict[str, Any]]):
+        os.makedirs(soimême.dossier, exist_ok=True)
+        temporaire = soimême.fichier_index + f'.{os.getpid()}'
+        with open(temporaire, 'w', encoding='utf8') as d:
+            json.dump(index, d, ensure_ascii=False, indent=2, default=str)
+        os.replace(temporaire, soimême.fichier_index)
+
+    @contextmanager
+    def _verrou(soimême, délai: float = 60):
+        # Plusieurs calibrations peuvent écrire à l'index en même temps (Modèle.appliquer_plusieurs)
+        os.makedirs(soimême.dossier, exist_ok=True)
+        verrou = soimême.fichier_index + '.verrou'
+        début = time.time()
+        while True:
+            try:
+                os.mkdir(verrou)
+                break
+            except FileExistsError:
+                if time.time() - début > délai:
+                    raise TimeoutError(f"Impossible d'obtenir le verrou {verrou}")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            os.rmdir(verrou)
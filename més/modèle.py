@@ -1,23 +1,60 @@
 from __future__ import annotations
 
+import glob
 import hashlib
+import json
+import multiprocessing
 import os.path
+import time
+from concurrent.futures import ProcessPoolExecutor
 from os import makedirs
-from typing import Union, Any, Optional, TypedDict
+from typing import Union, Any, Optional, Sequence, TypedDict, TYPE_CHECKING
 
-import arviz as az
-import matplotlib.pyplot as plt
 import numpy as np
-import plotly.graph_objects as go
-import pymc as pm
-import xarray as xr
+import pandas as pd
 
+from .ajustement import calculer_ajustement
+from .cache import cache_calibrations
 from .contexte import contexte
-from .données import Données
-from .variables import GroupeVars, Relation, Variable, VariableContinue
-from .variables.variable import nom_coefficient_relation
+from .données import Données, DonnéesGroupées
+from .effets import Effets, RésuméDistribution, calculer_effets, résumer_distribution
+from .figures import EmpreintesFigures, dessiner_traces_processus, dessiner_traces_variables, exporter_image
+from .graphe import GrapheCausal
+from .magasin import MagasinCalibrations
+from .profilage import Profileur, diagnostics_échantillonnage, fichier_profil, profiler, profiler_graphe
+from .scénarios import (
+    EffetsScénarios, Intervention, TAILLE_BLOC_SCÉNARIOS, disjonctif, paramètres_nécessaires, propager_scénarios
+)
+from .stockage import base_fichier, extension_format, écrire_calibration
+from .variables import GroupeVars, Relation, Variable, VariableContinue, VariableÉchelle, VariableCatégorique
+from .variables.catégorique import n_niveaux
+from .variables.variable import nom_coefficient_relation, nom_coefficient_groupé
+
+if TYPE_CHECKING:
+    # PyMC, ArviZ et Plotly sont lents à importer ; ils ne le sont que dans les fonctions qui en ont besoin
+    import arviz as az
+    import pymc as pm
 
 DOSSIER_RÉSULTATS = 'résultats'
+N_CHAÎNES = 4
+OPTIONS_ÉCHANTILLONNAGE = {
+    "tirages": 1000,
+    "ajustement": 1000,
+    "chaînes": N_CHAÎNES,
+    "graine": None,
+    "moteur": "pymc",
+    "options_moteur": {},
+    "minilots": None,
+    "compresser": False,
+    "hiérarchie": None,
+    "partager_modèle": False,
+    "factoriser": False,
+    "convergence": None,
+    "format": "netcdf",
+    "float32": False,
+    "compression": None,
+    "morceaux_tirages": None
+}
 
 
 class Impacte(TypedDict):
@@ -27,23 +64,63 @@ class Impacte(TypedDict):
     composantes: list[dict[str, Union[Variable, np.ndarray]]]
 
 
+class RésuméImpacte(TypedDict):
+    cheminement: list[Variable]
+    nom: str
+    résumé: RésuméDistribution
+    composantes: list[dict[str, Union[Variable, np.ndarray]]]
+
+
 class Modèle(object):
     def __init__(soimême, nom: str):
         soimême.nom = nom
         soimême.relations: list[Relation] = []
 
+        # Modèles PyMC construits avec des pm.MutableData, réutilisables pour toutes les données de même structure
+        soimême.modèles_pm: dict[str, pm.Model] = {}
+        # Pas NUTS de ces modèles, dont les fonctions logp et dlogp compilées lisent les mêmes pm.MutableData
+        soimême.étapes_pm: dict[str, Any] = {}
+
     def spécifier_relation(soimême, relation: Relation):
         soimême.relations.append(relation)
 
-    def appliquer(soimême, données: Données) -> ModèleCalibré:
-        mod = ModèleCalibré(soimême, données)
+    def appliquer(soimême, données: Union[Données, DonnéesGroupées], **options) -> ModèleCalibré:
+        mod = ModèleCalibré(soimême, données, **options)
         return mod
 
+    def appliquer_groupées(soimême, nom: str, l_données: list[Données], **options) -> ModèleCalibré:
+        # Une seule calibration pour tous les jeux de données, avec des coefficients partiellement mis en commun
+        return soimême.appliquer(DonnéesGroupées(nom, *l_données), **{"hiérarchie": "pays", **options})
+
+    def appliquer_plusieurs(
+            soimême,
+            l_données: list[Données],
+            cœurs: Optional[int] = None,
+            **options
+    ) -> list[ModèleCalibré]:
+        modèles = [soimême.appliquer(d, **options) for d in l_données]
+        à_calibrer = [m for m in modèles if not os.path.isfile(m.obtenir_fichier_calibs())]
+        if not à_calibrer:
+            return modèles
+
+        n_travaux, cœurs_par_travail = répartir_cœurs(len(à_calibrer), modèles[0].options["chaînes"], cœurs)
+        with ProcessPoolExecutor(
+                max_workers=n_travaux, mp_context=multiprocessing.get_context("spawn")
+        ) as exécuteur:
+            travaux = [exécuteur.submit(_calibrer, m, cœurs_par_travail) for m in à_calibrer]
+            for t in travaux:
+                t.result()
+
+        return modèles
+
     def empreinte_structure(soimême) -> str:
         return hashlib.md5(
             ";".join(f'{r.indépendante}->{r.dépendante}' for r in sorted(soimême.relations)).encode()
         ).hexdigest()[:10]
 
+    def __getstate__(soimême):
+        return {**soimême.__dict__, "modèles_pm": {}, "étapes_pm": {}}
+
     def __enter__(soimême):
         contexte.append(soimême)
 
@@ -52,32 +129,120 @@ class Modèle(object):
 
 
 class ModèleCalibré(object):
-    def __init__(soimême, modèle: Modèle, données: Données):
+    def __init__(soimême, modèle: Modèle, données: Union[Données, DonnéesGroupées], **options):
         soimême.modèle = modèle
         soimême.données = données
+        soimême.options = {**OPTIONS_ÉCHANTILLONNAGE, **options}
+
+        soimême._empreintes: dict[str, str] = {}
+        soimême._graphes: dict[str, GrapheCausal] = {}
+        soimême._résumés: dict[tuple[str, float], dict[tuple[str, str], dict[str, float]]] = {}
+        soimême._effets: dict[tuple[str, float], Effets] = {}
+
+        soimême.profil = Profileur()
+
+    @property
+    def graphe(soimême) -> GrapheCausal:
+        empreinte_structure = soimême.modèle.empreinte_structure()
+        if empreinte_structure not in soimême._graphes:
+            soimême._graphes[empreinte_structure] = GrapheCausal(
+                soimême.modèle.relations, soimême.résoudre_variable
+            )
+        return soimême._graphes[empreinte_structure]
+
+    def résumé_coefficients(soimême) -> dict[tuple[str, str], dict[str, float]]:
+        fichier_calibs = soimême.obtenir_fichier_calibs()
+        trace = soimême.obtenir_calibration()
+        clé = (fichier_calibs, os.path.getmtime(fichier_calibs))
+        if clé not in soimême._résumés:
+            soimême._résumés = {clé: soimême.graphe.résumer_coefficients(trace)}
+        return soimême._résumés[clé]
 
+    def effets(soimême) -> Effets:
+        fichier_calibs = soimême.obtenir_fichier_calibs()
+        trace = soimême.obtenir_calibration()
+        clé = (fichier_calibs, os.path.getmtime(fichier_calibs))
+        if clé not in soimême._effets:
+            soimême._effets = {clé: calculer_effets(trace, soimême.graphe)}
+        return soimême._effets[clé]
+
+    def effet(
+            soimême,
+            indépendante: Union[GroupeVars, Variable],
+            dépendante: Union[GroupeVars, Variable]
+    ) -> dict[str, np.ndarray]:
+        effets = soimême.effets()
+        i = soimême.graphe.index[str(soimême.résoudre_variable(indépendante))]
+        j = soimême.graphe.index[str(soimême.résoudre_variable(dépendante))]
+        return {
+            "direct": effets["directs"][..., i, j],
+            "indirect": effets["indirects"][..., i, j],
+            "total": effets["totaux"][..., i, j]
+        }
+
+    @profiler("impacte")
     def impacte(
             soimême,
             dépendante: Union[GroupeVars, Variable],
-            indépendante: Union[GroupeVars, Variable]
-    ) -> list[Impacte]:
+            indépendante: Union[GroupeVars, Variable],
+            résumé: bool = False,
+            quantiles: Sequence[float] = (0.025, 0.5, 0.975),
+            prob_hdi: float = 0.94,
+            taille_bloc: int = 10000,
+            par_groupe: bool = False,
+            pas_tirages: Optional[int] = None
+    ) -> Union[list[Impacte], list[RésuméImpacte]]:
         cheminements = soimême.cheminements(dépendante, indépendante)
         trace = soimême.obtenir_calibration()
 
+        # Avec un modèle hiérarchique, on peut obtenir les distributions des impactes pour chaque groupe (région)
+        dim = soimême.options["hiérarchie"]
+        if par_groupe and dim is None:
+            raise ValueError("Les impactes par groupe nécessitent un modèle hiérarchique (option « hiérarchie »)")
+        if par_groupe and résumé:
+            raise ValueError("Le mode résumé n'est pas disponible pour les impactes par groupe.")
+
+        # Les composantes sont des vues sur le postérieur, partagées entre cheminements
+        coefficients: dict[str, np.ndarray] = {}
+
+        def obtenir_coefficient(de: Variable, à: Variable) -> np.ndarray:
+            coefficient = nom_coefficient_relation(de, à)
+            if par_groupe:
+                coefficient = nom_coefficient_groupé(coefficient, dim)
+            if coefficient not in coefficients:
+                # Seuls le coefficient et, le cas échéant, un tirage sur `pas_tirages` sont lus du disque
+                valeurs = trace.posterior[coefficient]
+                if valeurs.ndim > (3 if par_groupe else 2):
+                    # Les relations impliquant une variable catégorique ont un coefficient par niveau, qui ne peut
+                    # être multiplié le long d'un cheminement
+                    raise ValueError(
+                        f"Le coefficient {coefficient} a une valeur par niveau (variable catégorique) et ne peut être "
+                        f"combiné dans un cheminement. Utilisez plutôt ModèleCalibré.scénarios."
+                    )
+                if pas_tirages is not None:
+                    valeurs = valeurs.isel(draw=slice(None, None, pas_tirages))
+                coefficients[coefficient] = valeurs.values
+            return coefficients[coefficient]
+
+        def composantes_cheminement(ch: list[Variable]) -> list[dict[str, Union[Variable, np.ndarray]]]:
+            return [{
+                "dépendante": v,
+                "indépendante": ch[i],
+                "dist": obtenir_coefficient(ch[i], v)
+            } for i, v in enumerate(ch[1:])]
+
+        if résumé:
+            return soimême._résumer_impactes(
+                cheminements, composantes_cheminement, quantiles=quantiles, prob_hdi=prob_hdi,
+                taille_bloc=taille_bloc
+            )
+
         impactes: list[Impacte] = []
         for ch in cheminements:
+            composantes = composantes_cheminement(ch)
             impacte = np.array(1.)
-            composantes = []
-            for i, v in enumerate(ch[1:]):
-                coefficient = nom_coefficient_relation(ch[i], v)
-                impacte_ch = trace.posterior[coefficient].values
-
-                impacte = impacte * impacte_ch
-                composantes.append({
-                    "dépendante": v,
-                    "indépendante": ch[i],
-                    "dist": impacte_ch
-                })
+            for c in composantes:
+                impacte = impacte * c["dist"]
             impactes.append(Impacte(
                 cheminement=ch,
                 nom=" -> ".join(str(v) for v in ch),
@@ -87,40 +252,191 @@ class ModèleCalibré(object):
 
         return impactes
 
-    def dessiner_impacte(soimême):
-        trace = soimême.obtenir_calibration()
-
-        relations = soimême.modèle.relations
-        variables = list(set([
-            x for r in relations for x in [
-                soimême.résoudre_variable(r.dépendante),
-                soimême.résoudre_variable(r.indépendante)
+    def impacte_par_groupe(
+            soimême,
+            dépendante: Union[GroupeVars, Variable],
+            indépendante: Union[GroupeVars, Variable],
+            pas_tirages: Optional[int] = None
+    ) -> dict[str, list[Impacte]]:
+        # Impactes globaux et, pour chaque groupe (p. ex., chaque pays de DonnéesGroupées), ceux de ses coefficients
+        # partiellement mis en commun, tous tirés de la même calibration
+        dim = soimême.options["hiérarchie"]
+        if dim is None:
+            raise ValueError("Les impactes par groupe nécessitent un modèle hiérarchique (option « hiérarchie »)")
+        impactes = {"global": soimême.impacte(dépendante, indépendante, pas_tirages=pas_tirages)}
+        par_groupe = soimême.impacte(dépendante, indépendante, par_groupe=True, pas_tirages=pas_tirages)
+        for i, groupe in enumerate(soimême.groupes(dim)[1]):
+            impactes[str(groupe)] = [
+                Impacte(
+                    cheminement=imp["cheminement"],
+                    nom=imp["nom"],
+                    dist=np.take(imp["dist"], i, axis=2),
+                    composantes=[{**c, "dist": np.take(c["dist"], i, axis=2)} for c in imp["composantes"]]
+                ) for imp in par_groupe
             ]
-        ]))
-        TRANSPARENTE = 'rgba(0,0,0, 0)'
-        r2 = {}
-        with pm.Model():
-            soimême.créer_modèle()
-            r = pm.sample_posterior_predictive(trace)
-            for v in variables:
-                if isinstance(v, VariableContinue):
-                    z = xr.broadcast(
-                        r["observed_data"][str(v)],
-                        r["posterior_predictive"].rename({f"{str(v)}_dim_2": f"{str(v)}_dim_0"})[str(v)]
+        return impactes
+
+    @staticmethod
+    def _résumer_impactes(
+            cheminements: list[list[Variable]],
+            composantes_cheminement,
+            quantiles: Sequence[float],
+            prob_hdi: float,
+            taille_bloc: int
+    ) -> list[RésuméImpacte]:
+        résumés: list[RésuméImpacte] = []
+        tampon: Optional[np.ndarray] = None
+
+        for ch in cheminements:
+            composantes = composantes_cheminement(ch)
+            vues = [c["dist"].reshape(-1) for c in composantes]
+            n = vues[0].size
+            if any(vue.size != n for vue in vues):
+                raise ValueError(f"Les composantes du cheminement {' -> '.join(str(v) for v in ch)} n'ont pas la "
+                                 f"même forme.")
+            if tampon is None or tampon.size != n:
+                tampon = np.empty(n)
+
+            # Calculer le produit par blocs de tirages dans un tampon réutilisé pour chaque cheminement
+            for début in range(0, n, taille_bloc):
+                bloc = tampon[début:début + taille_bloc]
+                np.copyto(bloc, vues[0][début:début + taille_bloc])
+                for vue in vues[1:]:
+                    np.multiply(bloc, vue[début:début + taille_bloc], out=bloc)
+
+            résumés.append(RésuméImpacte(
+                cheminement=ch,
+                nom=" -> ".join(str(v) for v in ch),
+                résumé=résumer_distribution(tampon, quantiles=quantiles, prob_hdi=prob_hdi),
+                composantes=composantes
+            ))
+
+        return résumés
+
+    @profiler("scénarios")
+    def scénarios(
+            soimême,
+            scénarios: dict[str, Union[Intervention, list[Intervention]]],
+            résumé: bool = False,
+            quantiles: Sequence[float] = (0.025, 0.5, 0.975),
+            prob_hdi: float = 0.94,
+            lignes: Optional[np.ndarray] = None,
+            pas_tirages: Optional[int] = None,
+            taille_bloc: int = TAILLE_BLOC_SCÉNARIOS
+    ) -> Union[EffetsScénarios, dict[str, dict[str, RésuméDistribution]]]:
+        # Chaque scénario est un ensemble d'interventions, propagées dans le graphe pour tous les tirages du postérieur
+        # à la fois. Les effets sont les changements moyens (sur les lignes `lignes`, ou toutes) par rapport au
+        # scénario de base, où les mêmes variables sont propagées sans intervention.
+        scénarios = {n: [i] if isinstance(i, Intervention) else list(i) for n, i in scénarios.items()}
+        graphe = soimême.graphe
+        n_scénarios = len(scénarios) + 1
+
+        valeurs = {}
+        for v in graphe.ordre:
+            x = np.asarray(soimême.données.obtenir(v))
+            valeurs[str(v)] = disjonctif(x, n_niveaux(x)) if isinstance(v, VariableCatégorique) else x.astype(float)
+        n_lignes = len(next(iter(valeurs.values())))
+
+        fixées: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+        for s, interventions in enumerate(scénarios.values(), start=1):
+            for intervention in interventions:
+                variable = soimême.résoudre_variable(intervention.variable)
+                if variable not in graphe:
+                    raise ValueError(f"Variable {variable} absente du modèle {soimême.modèle.nom}.")
+                catégorique = isinstance(variable, VariableCatégorique)
+                if catégorique and intervention.delta is not None:
+                    raise ValueError(f"Les interventions sur la variable catégorique {variable} doivent spécifier une "
+                                     f"`valeur`.")
+
+                masque = np.ones(n_lignes, dtype=bool) if intervention.masque is None else np.asarray(
+                    intervention.masque, dtype=bool
+                )
+                brutes = soimême.données.brutes(variable)
+                if intervention.delta is not None:
+                    nouvelles = brutes[masque] + intervention.delta
+                else:
+                    nouvelles = pd.Series(
+                        np.broadcast_to(intervention.valeur, int(masque.sum())), index=brutes.index[masque]
+                    )
+                préparées = soimême.données.transformer(variable, nouvelles)
+                if catégorique:
+                    if np.any(préparées < 0):
+                        raise ValueError(f"Valeur {intervention.valeur} absente des données pour {variable}.")
+                    préparées = disjonctif(préparées, valeurs[str(variable)].shape[-1])
+
+                if str(variable) not in fixées:
+                    fixées[str(variable)] = (
+                        np.zeros((n_scénarios, n_lignes), dtype=bool),
+                        np.repeat(valeurs[str(variable)][None], n_scénarios, axis=0)
                     )
-                    y_obs = z[0]
-                    y_préd = z[1]
-                    r2[str(v)] = ((
-                                      ((y_obs - y_obs.mean(dim=f"{str(v)}_dim_0")) *
-                                       (y_préd - y_préd.mean(dim=f"{str(v)}_dim_0")))
-                                  ).sum(dim=f"{str(v)}_dim_0") / (
-                                          ((y_obs - y_obs.mean(dim=f"{str(v)}_dim_0")) ** 2).sum(
-                                              dim=f"{str(v)}_dim_0") * (
-                                                  (y_préd - y_préd.mean(dim=f"{str(v)}_dim_0")) ** 2).sum(
-                                      dim=f"{str(v)}_dim_0")
-                                  ) ** 0.5).mean().values
+                masques, imposées = fixées[str(variable)]
+                masques[s, masque] = True
+                imposées[s, masque] = préparées
+
+        # Les descendants des variables modifiées prennent leur valeur attendue selon leurs parents
+        à_propager: set[str] = set()
+        pile = list(fixées)
+        while pile:
+            for e in graphe.enfants[pile.pop()]:
+                if str(e) not in à_propager:
+                    à_propager.add(str(e))
+                    pile.append(str(e))
+
+        dim = soimême.options["hiérarchie"]
+        codes_groupes = None if dim is None else soimême.groupes(dim)[0]
+        postérieur = soimême.obtenir_calibration().posterior
+        if pas_tirages is not None:
+            postérieur = postérieur.isel(draw=slice(None, None, pas_tirages))
+        paramètres = {
+            n: postérieur[n].stack(tirage=("chain", "draw")).transpose("tirage", ...).values
+            for n in paramètres_nécessaires([v for v in graphe.ordre if str(v) in à_propager], graphe.parents, dim)
+        }
+
+        effets = propager_scénarios(
+            graphe.ordre, graphe.parents, à_propager, valeurs, fixées, paramètres,
+            n_scénarios=n_scénarios,
+            n_tirages=postérieur.sizes["chain"] * postérieur.sizes["draw"],
+            codes_groupes=codes_groupes,
+            dim_groupes=dim,
+            lignes=lignes,
+            taille_bloc=taille_bloc
+        )
+        if not résumé:
+            return EffetsScénarios(scénarios=list(scénarios), variables=list(effets), effets=effets)
+
+        résumés: dict[str, dict[str, RésuméDistribution]] = {}
+        for i, nom in enumerate(scénarios):
+            résumés[nom] = {}
+            for v, x in effets.items():
+                if x.ndim == 2:
+                    résumés[nom][v] = résumer_distribution(np.array(x[i], dtype=float), quantiles, prob_hdi)
                 else:
-                    r2[str(v)] = 1.0  # Variables ingresos no tienen r^2
+                    for k in range(x.shape[-1]):
+                        résumés[nom][f"{v}[{k}]"] = résumer_distribution(
+                            np.array(x[i, :, k], dtype=float), quantiles, prob_hdi
+                        )
+        return résumés
+
+    @profiler("dessiner_impacte")
+    def dessiner_impacte(soimême, n_tirages: Optional[int] = None, forcer: bool = False):
+        import plotly.graph_objects as go
+
+        # Calibre le modèle au besoin, avant de calculer l'empreinte de la calibration
+        soimême.obtenir_calibration()
+        fichier_figure = soimême.obtenir_fichier_graphiques("sankey.jpeg")
+        empreintes = EmpreintesFigures(os.path.dirname(fichier_figure))
+        empreinte = soimême.empreinte_calibration() + ('' if n_tirages is None else f'_{n_tirages}')
+        if not forcer and empreintes.à_jour(fichier_figure, empreinte):
+            return
+
+        graphe = soimême.graphe
+        variables = graphe.variables
+        TRANSPARENTE = 'rgba(0,0,0, 0)'
+        ajustement = soimême.ajustement(n_tirages)
+        r2 = {
+            str(v): ajustement[str(v)]["r2"] if str(v) in ajustement else 1.0  # Variables ingresos no tienen r^2
+            for v in variables
+        }
 
         liens = {
             "source": [],
@@ -129,48 +445,33 @@ class ModèleCalibré(object):
             "color": []
         }
 
-        def trace_relation(de: Variable, à: Variable) -> np.ndarray:
-            var_de = soimême.résoudre_variable(de)
-            var_à = soimême.résoudre_variable(à)
-            coef = nom_coefficient_relation(var_de, var_à)
-            return trace.posterior[coef].values
+        résumé = soimême.résumé_coefficients()
 
         def force_relation(de: Variable, à: Variable) -> float:
-            return abs(trace_relation(de, à).mean())
+            return résumé[(str(de), str(à))]["force"]
 
         étiquettes = [str(v) for v in variables]
 
-        # Normaliser les impactes
+        # Normaliser les impactes, en commençant par les variables sans dépendantes
         facteurs = {}
-        while len(facteurs) < len(variables):
-            non_normalisées = [v for v in variables if str(v) not in facteurs]
-            prêtes = [
-                v for v in non_normalisées if not any(
-                    soimême.résoudre_variable(r.indépendante) is v and soimême.résoudre_variable(
-                        r.dépendante) in non_normalisées for r in relations
-                )
-            ]
+        for p in reversed(graphe.ordre):
+            causes_de_p = graphe.parents[str(p)]
+            dépendantes_de_p = graphe.enfants[str(p)]
+            taille_sortie_p = np.sum([
+                force_relation(de=p, à=d) * facteurs[str(d)] for d in dépendantes_de_p
+            ]) or 1
+            taille_entrée_p = np.sum([
+                force_relation(de=c, à=p) for c in causes_de_p
+            ]) or taille_sortie_p
+            facteur_p = taille_sortie_p / taille_entrée_p
+            facteurs[str(p)] = facteur_p * r2[str(p)]
 
-            for p in prêtes:
-                causes_de_p = [soimême.résoudre_variable(r.indépendante) for r in relations if
-                               soimême.résoudre_variable(r.dépendante) is p]
-                dépendantes_de_p = [soimême.résoudre_variable(r.dépendante) for r in relations if
-                                    soimême.résoudre_variable(r.indépendante) is p]
-                taille_sortie_p = np.sum([
-                    force_relation(de=p, à=d) * facteurs[str(d)] for d in dépendantes_de_p
-                ]) or 1
-                taille_entrée_p = np.sum([
-                    force_relation(de=c, à=p) for c in causes_de_p
-                ]) or taille_sortie_p
-                facteur_p = taille_sortie_p / taille_entrée_p
-                facteurs[str(p)] = facteur_p * r2[str(p)]
-
-                if causes_de_p:
-                    étiquettes.append("")
-                    liens["source"].append(len(étiquettes) - 1)
-                    liens["target"].append(étiquettes.index(str(p)))
-                    liens["value"].append((1 - r2[str(p)]) * taille_sortie_p)
-                    liens["color"].append(TRANSPARENTE)
+            if causes_de_p:
+                étiquettes.append("")
+                liens["source"].append(len(étiquettes) - 1)
+                liens["target"].append(étiquettes.index(str(p)))
+                liens["value"].append((1 - r2[str(p)]) * taille_sortie_p)
+                liens["color"].append(TRANSPARENTE)
 
         def générer_couleur(nom_variable: str, lien=False):
             palette = [
@@ -183,10 +484,7 @@ class ModèleCalibré(object):
             i_variable = [str(x) for x in variables].index(nom_variable) % len(palette)
             return f"rgba({', '.join(str(x) for x in palette[i_variable])}, {0.2 if lien else 1})"
 
-        for r in relations:
-            var_r_indépendante = soimême.résoudre_variable(r.indépendante)
-            var_r_dépendante = soimême.résoudre_variable(r.dépendante)
-
+        for var_r_indépendante, var_r_dépendante in graphe.relations:
             liens["source"].append(étiquettes.index(str(var_r_indépendante)))
             liens["target"].append(étiquettes.index(str(var_r_dépendante)))
             liens["value"].append(
@@ -208,66 +506,373 @@ class ModèleCalibré(object):
         ])
 
         fig.update_layout(title_text=soimême.modèle.nom)
-        fig.write_image(soimême.obtenir_fichier_graphiques(f"sankey.jpeg"), scale=4)
+        exporter_image(fig, fichier_figure, scale=4)
+        empreintes.marquer(fichier_figure, empreinte)
+        empreintes.sauvegarder()
+
+    def ajustement(soimême, n_tirages: Optional[int] = None) -> dict[str, dict[str, float]]:
+        prédictions = soimême.obtenir_prédictions(n_tirages).posterior_predictive
+        continues = [
+            v for v in soimême.graphe.variables
+            if isinstance(v, VariableContinue) and str(v) in prédictions
+        ]
+        if not continues:
+            return {}
+
+        # Toutes les variables continues ont le même nombre d'observations, on peut donc les traiter ensemble
+        observées = np.stack([soimême.données.obtenir(v) for v in continues]).astype(float)
+        prédites = np.stack([
+            prédictions[str(v)].values.reshape(-1, observées.shape[-1]) for v in continues
+        ])
+        métriques = calculer_ajustement(observées, prédites)
+        return {
+            str(v): {m: float(valeurs[i]) for m, valeurs in métriques.items()} for i, v in enumerate(continues)
+        }
+
+    def obtenir_prédictions(soimême, n_tirages: Optional[int] = None) -> az.InferenceData:
+        import arviz as az
+        import pymc as pm
+
+        fichier_prédictions = soimême.obtenir_fichier_prédictions(n_tirages)
+        if not os.path.isfile(fichier_prédictions):
+            trace = soimême.obtenir_calibration()
+            postérieur = trace.posterior
+            if n_tirages is not None and n_tirages < postérieur.sizes["draw"]:
+                générateur = np.random.default_rng(soimême.options["graine"])
+                tirages = np.sort(générateur.choice(postérieur.sizes["draw"], size=n_tirages, replace=False))
+                postérieur = postérieur.isel(draw=tirages)
+
+            with soimême.modèle_pm(prédictions=True):
+                prédictions = pm.sample_posterior_predictive(postérieur, random_seed=soimême.options["graine"])
+
+            cache_calibrations.retirer(fichier_prédictions)
+            soimême.écrire(
+                az.InferenceData(posterior_predictive=prédictions.posterior_predictive), fichier_prédictions
+            )
+
+        return cache_calibrations.obtenir(fichier_prédictions)
 
     def cheminements(
             soimême, indépendante: Union[GroupeVars, Variable], dépendante: Union[GroupeVars, Variable]
     ) -> list[list[Variable]]:
         var_dépendante = soimême.résoudre_variable(dépendante)
         var_indépendante = soimême.résoudre_variable(indépendante)
-        relations = soimême.modèle.relations
-
-        def chercher_cheminement(de: Variable, à: Variable, base: Optional[list[Variable]] = None):
-            cheminements: list[list[Variable]] = []
-            relations_de = [r for r in relations if soimême.résoudre_variable(r.indépendante) is de]
-            base = base or [de]
-            for r in relations_de:
-                dépendante_r = soimême.résoudre_variable(r.dépendante)
-                if dépendante_r is à:
-                    cheminements.append([*base, dépendante_r])
-                else:
-                    for ch in chercher_cheminement(de=dépendante_r, à=à, base=[*base, dépendante_r]):
-                        cheminements.append(ch)
-            return cheminements
+        return soimême.graphe.cheminements(var_indépendante, var_dépendante)
 
-        return chercher_cheminement(var_indépendante, var_dépendante)
-
-    def dessiner_traces(soimême):
+    @profiler("dessiner_traces")
+    def dessiner_traces(soimême, processus: Optional[int] = None, forcer: bool = False):
         trace = soimême.obtenir_calibration()
+        fichier_calibs = soimême.obtenir_fichier_calibs()
+        empreinte = soimême.empreinte_calibration()
+
+        fichiers = {
+            v: soimême.obtenir_fichier_graphiques(os.path.join("traces", v + ".png")) for v in trace.posterior
+        }
+        empreintes = EmpreintesFigures(os.path.dirname(next(iter(fichiers.values()))))
+        à_dessiner = [v for v, f in fichiers.items() if forcer or not empreintes.à_jour(f, empreinte)]
+        if not à_dessiner:
+            return
 
-        for v in trace.posterior:
-            az.plot_trace(trace, [v])
-            fig = plt.gcf()
-            fig.suptitle(f"Trace {soimême.données.nom}, {v}")
+        titre = f"Trace {soimême.données.nom}"
+        processus = min(processus or os.cpu_count() or 1, len(à_dessiner))
+        if processus > 1:
+            # Chaque processus dessine une partie des variables
+            lots = [à_dessiner[i::processus] for i in range(processus)]
+            with ProcessPoolExecutor(
+                    max_workers=processus, mp_context=multiprocessing.get_context("spawn")
+            ) as exécuteur:
+                travaux = [
+                    exécuteur.submit(
+                        dessiner_traces_processus,
+                        os.path.abspath(fichier_calibs), lot, [fichiers[v] for v in lot], titre
+                    ) for lot in lots
+                ]
+                for t in travaux:
+                    t.result()
+        else:
+            dessiner_traces_variables(fichier_calibs, à_dessiner, [fichiers[v] for v in à_dessiner], titre)
 
-            nom_fichier = os.path.join("traces", v)
-            fichier_figure = os.path.join(soimême.obtenir_fichier_graphiques(nom_fichier))
-            fig.savefig(fichier_figure)
-            plt.close(fig)
+        for v in à_dessiner:
+            empreintes.marquer(fichiers[v], empreinte)
+        empreintes.sauvegarder()
+
+    def empreinte_calibration(soimême) -> str:
+        # Change si la calibration est refaite, même avec les mêmes données et options
+        fichier_calibs = soimême.obtenir_fichier_calibs()
+        return f"{soimême.empreinte()}_{os.stat(fichier_calibs).st_mtime_ns}"
+
+    def avec(soimême, **options) -> ModèleCalibré:
+        return ModèleCalibré(soimême.modèle, soimême.données, **{**soimême.options, **options})
+
+    def changer_options(soimême, **options):
+        # Les calibrations (et donc les impactes, figures, etc.) qui suivent utiliseront les nouvelles options
+        soimême.options = {**soimême.options, **options}
+        soimême._empreintes.clear()
+
+    @profiler("obtenir_calibration")
+    def obtenir_calibration(soimême, moteur: Optional[str] = None, **options_moteur):
+        if moteur is not None:
+            soimême.changer_options(moteur=moteur, options_moteur=options_moteur)
 
-    def obtenir_calibration(soimême):
         fichier_calibs = soimême.obtenir_fichier_calibs()
         if not os.path.isfile(fichier_calibs):
             soimême.calibrer()
 
-        return az.from_netcdf(fichier_calibs)
+        return cache_calibrations.obtenir(fichier_calibs)
 
-    def calibrer(soimême):
+    def échantillonner(
+            soimême,
+            cœurs: Optional[int] = None,
+            profiler_modèle: bool = False,
+            équation: Optional[Variable] = None
+    ) -> az.InferenceData:
+        from .moteurs import (
+            MOTEURS_NUTS, ajuster_minilots, diagnostics_convergence, noter_convergence, échantillonner,
+            échantillonner_adaptatif
+        )
+
+        minilots = soimême.options["minilots"]
+        with soimême.profil.phase("préparation_données"):
+            soimême.données.préparées()
+        with soimême.profil.phase("construction_modèle"):
+            modèle_pm = soimême.modèle_pm(équation=équation)
+
+        with modèle_pm, soimême.profil.phase("échantillonnage"):
+            if profiler_modèle:
+                soimême.profil.profils_graphe = profiler_graphe(modèle_pm)
+            début = time.perf_counter()
+            if minilots:
+                trace = ajuster_minilots(
+                    tirages=soimême.options["tirages"],
+                    graine=soimême.options["graine"],
+                    options_moteur=soimême.options["options_moteur"]
+                )
+                trace.posterior.attrs["moteur"] = "advi_minilots"
+                soimême.profil.diagnostics = diagnostics_échantillonnage(trace, time.perf_counter() - début)
+                return trace
+
+            moteur = soimême.options["moteur"]
+            options_moteur = soimême.options["options_moteur"]
+            if soimême.options["partager_modèle"] and moteur == "pymc":
+                # pm.sample recompilerait logp et dlogp à chaque appel ; on lui passe plutôt le pas déjà compilé
+                options_moteur = {"step": soimême.étape_pm(modèle_pm, équation), **options_moteur}
+            options = dict(
+                tirages=soimême.options["tirages"],
+                ajustement=soimême.options["ajustement"],
+                chaînes=soimême.options["chaînes"],
+                graine=soimême.options["graine"],
+                cœurs=cœurs,
+                options_moteur=options_moteur
+            )
+            # `convergence` : True pour les cibles par défaut (moteurs.CIBLES_CONVERGENCE), ou un dictionnaire de cibles
+            convergence = soimême.options["convergence"]
+            if convergence:
+                trace = échantillonner_adaptatif(
+                    moteur, **options, cibles=None if convergence is True else convergence
+                )
+            else:
+                trace = échantillonner(moteur, **options)
+                if moteur in MOTEURS_NUTS:
+                    noter_convergence(trace, diagnostics_convergence(trace))
+            durée = time.perf_counter() - début
+        trace.posterior.attrs["moteur"] = soimême.options["moteur"]
+        soimême.profil.diagnostics = diagnostics_échantillonnage(trace, durée)
+        return trace
+
+    def calibrer(
+            soimême,
+            cœurs: Optional[int] = None,
+            moteur: Optional[str] = None,
+            profiler_modèle: bool = False,
+            **options_moteur
+    ):
+        if moteur is not None:
+            soimême.changer_options(moteur=moteur, options_moteur=options_moteur)
+
+        # Le profil sauvegardé avec la calibration ne décrit que celle-ci
+        soimême.profil.vider()
         fichier_calibs = soimême.obtenir_fichier_calibs()
-        with pm.Model():
-            soimême.créer_modèle()
-            trace = pm.sample()
+        if soimême.options["factoriser"]:
+            trace = soimême.calibrer_équations(cœurs=cœurs)
+        else:
+            trace = soimême.échantillonner(cœurs=cœurs, profiler_modèle=profiler_modèle)
 
         dossier_calibs = os.path.dirname(fichier_calibs)
-        if not os.path.isdir(dossier_calibs):
-            makedirs(dossier_calibs)
+        makedirs(dossier_calibs, exist_ok=True)
+
+        # Fermer une éventuelle ancienne version du fichier encore ouverte dans le cache et effacer les prédictions
+        # tirées de l'ancien postérieur
+        cache_calibrations.retirer(fichier_calibs)
+        soimême.effacer_prédictions()
+        with soimême.profil.phase("écriture"):
+            soimême.écrire(trace, fichier_calibs)
+        soimême.magasin.enregistrer(soimême.empreinte(), fichier_calibs, soimême.métadonnées())
+        soimême.sauvegarder_profil()
 
-        az.to_netcdf(trace, fichier_calibs)
+    def calibrer_équations(soimême, cœurs: Optional[int] = None) -> az.InferenceData:
+        from .moteurs import assembler_équations
+
+        # Sans données manquantes, la vraisemblance se factorise en une régression par variable dépendante. Chaque
+        # équation est donc calibrée séparément et gardée sous sa propre empreinte ; après un changement de structure,
+        # seules les équations touchées sont recalibrées.
+        équations = soimême.équations()
+        à_calibrer = [v for v in équations if soimême.magasin_équations.obtenir(soimême.empreinte_équation(v)) is None]
+
+        début = time.perf_counter()
+        with soimême.profil.phase("équations"):
+            n_travaux, cœurs_par_travail = répartir_cœurs(len(à_calibrer), soimême.options["chaînes"], cœurs)
+            if n_travaux > 1:
+                with ProcessPoolExecutor(
+                        max_workers=n_travaux, mp_context=multiprocessing.get_context("spawn")
+                ) as exécuteur:
+                    travaux = [
+                        exécuteur.submit(_calibrer_équation, soimême, str(v), cœurs_par_travail) for v in à_calibrer
+                    ]
+                    for t in travaux:
+                        t.result()
+            else:
+                for v in à_calibrer:
+                    soimême.calibrer_équation(v, cœurs=cœurs)
+
+        with soimême.profil.phase("assemblage"):
+            trace = assembler_équations({
+                str(v): cache_calibrations.obtenir(soimême.obtenir_fichier_équation(v)) for v in équations
+            })
+        soimême.profil.diagnostics = {
+            **diagnostics_échantillonnage(trace, time.perf_counter() - début),
+            "équations": len(équations),
+            "équations_recalibrées": [str(v) for v in à_calibrer]
+        }
+        return trace
+
+    def calibrer_équation(soimême, équation: Variable, cœurs: Optional[int] = None):
+        trace = soimême.échantillonner(cœurs=cœurs, équation=équation)
+        fichier = soimême.obtenir_fichier_équation(équation)
+        makedirs(os.path.dirname(fichier), exist_ok=True)
+
+        cache_calibrations.retirer(fichier)
+        soimême.écrire(trace, fichier)
+        soimême.magasin_équations.enregistrer(
+            soimême.empreinte_équation(équation), fichier, soimême.métadonnées_équation(équation)
+        )
+
+    def écrire(soimême, trace: az.InferenceData, fichier: str):
+        écrire_calibration(
+            trace, fichier, float32=soimême.options["float32"], compression=soimême.options["compression"],
+            morceaux_tirages=soimême.options["morceaux_tirages"]
+        )
+
+    def équations(soimême) -> list[Variable]:
+        # Les variables sans parents n'ont pas de paramètres à calibrer
+        return [v for v in soimême.graphe.ordre if soimême.graphe.parents[str(v)]]
+
+    def variables_modèle(soimême, équation: Optional[Variable] = None) -> list[Variable]:
+        if équation is None:
+            return list(soimême.graphe.ordre)
+        return [*soimême.graphe.parents[str(équation)], équation]
+
+    def sauvegarder_profil(soimême):
+        # Sauvegardé par `calibrer` ; à appeler explicitement pour y ajouter les phases suivantes (impactes, figures).
+        # Le profil accompagne le fichier de calibration ; rien à sauvegarder si celui-ci n'a pas (encore) été écrit.
+        fichier_calibs = soimême.obtenir_fichier_calibs()
+        if os.path.isfile(fichier_calibs):
+            soimême.profil.sauvegarder(fichier_profil(fichier_calibs))
+
+    @property
+    def magasin(soimême) -> MagasinCalibrations:
+        return MagasinCalibrations(os.path.join(DOSSIER_RÉSULTATS, 'calibs'))
+
+    @property
+    def magasin_équations(soimême) -> MagasinCalibrations:
+        # Séparé du magasin des calibrations, dont le nettoyage effacerait les fichiers d'équations qu'il ne connaît pas
+        return MagasinCalibrations(os.path.join(DOSSIER_RÉSULTATS, 'équations'))
+
+    def empreinte(soimême) -> str:
+        # L'empreinte dépend des données préparées, des variables et de leurs paramètres, et des options de
+        # l'échantillonnage, et non seulement des noms des relations
+        empreinte_structure = soimême.modèle.empreinte_structure()
+        if empreinte_structure not in soimême._empreintes:
+            variables = soimême.résoudre_variables()
+            contenu = {
+                "relations": soimême.relations_résolues(),
+                "variables": {str(v): v.configuration() for v in variables},
+                "données": soimême.données.empreinte(variables),
+                "options": soimême.options
+            }
+            soimême._empreintes[empreinte_structure] = hashlib.sha256(
+                json.dumps(contenu, sort_keys=True, default=str).encode()
+            ).hexdigest()
+        return soimême._empreintes[empreinte_structure]
+
+    def empreinte_équation(soimême, équation: Variable) -> str:
+        # Ne dépend que de la variable, de ses parents et de leurs données : une même équation est partagée entre
+        # les structures (et les modèles) qui la contiennent
+        variables = soimême.variables_modèle(équation)
+        contenu = {
+            "équation": str(équation),
+            "parents": sorted(str(v) for v in variables[:-1]),
+            "variables": {str(v): v.configuration() for v in variables},
+            "données": soimême.données.empreinte(variables),
+            "options": {o: x for o, x in soimême.options.items() if o != "factoriser"}
+        }
+        return hashlib.sha256(json.dumps(contenu, sort_keys=True, default=str).encode()).hexdigest()
+
+    def métadonnées_équation(soimême, équation: Variable) -> dict[str, Any]:
+        variables = soimême.variables_modèle(équation)
+        return {
+            "équation": str(équation),
+            "parents": [str(v) for v in variables[:-1]],
+            "données": soimême.données.nom,
+            "variables": {str(v): v.configuration() for v in variables},
+            "options": soimême.options
+        }
+
+    def métadonnées(soimême) -> dict[str, Any]:
+        return {
+            "modèle": soimême.modèle.nom,
+            "données": soimême.données.nom,
+            "structure": soimême.modèle.empreinte_structure(),
+            "relations": soimême.relations_résolues(),
+            "groupes": soimême.groupes_résolus(),
+            "variables": {str(v): v.configuration() for v in soimême.résoudre_variables()},
+            "options": soimême.options
+        }
+
+    def relations_résolues(soimême) -> list[list[str]]:
+        return [
+            [str(soimême.résoudre_variable(r.indépendante)), str(soimême.résoudre_variable(r.dépendante))]
+            for r in sorted(soimême.modèle.relations)
+        ]
+
+    def groupes_résolus(soimême) -> dict[str, str]:
+        return {
+            str(v): str(soimême.résoudre_variable(v))
+            for r in soimême.modèle.relations for v in [r.indépendante, r.dépendante] if isinstance(v, GroupeVars)
+        }
 
     def obtenir_fichier_calibs(soimême):
         empreinte_structure = soimême.modèle.empreinte_structure()
         return os.path.join(DOSSIER_RÉSULTATS, 'calibs', soimême.modèle.nom + "_" + empreinte_structure,
-                            soimême.données.nom + '.ncdf')
+                            soimême.données.nom + "_" + soimême.empreinte()[:16] + soimême.extension())
+
+    def obtenir_fichier_équation(soimême, équation: Variable) -> str:
+        return os.path.join(
+            DOSSIER_RÉSULTATS, 'équations',
+            str(équation) + "_" + soimême.empreinte_équation(équation)[:16] + soimême.extension()
+        )
+
+    def obtenir_fichier_prédictions(soimême, n_tirages: Optional[int] = None) -> str:
+        base = base_fichier(soimême.obtenir_fichier_calibs())
+        return base + '.prédictions' + ('' if n_tirages is None else f'_{n_tirages}') + soimême.extension()
+
+    def effacer_prédictions(soimême):
+        base = base_fichier(soimême.obtenir_fichier_calibs())
+        for fichier in glob.glob(glob.escape(base) + '.prédictions*'):
+            cache_calibrations.retirer(fichier)
+            os.remove(fichier)
+
+    def extension(soimême) -> str:
+        return extension_format(soimême.options["format"])
 
     def obtenir_fichier_graphiques(soimême, nom_fichier: str) -> str:
         empreinte_structure = soimême.modèle.empreinte_structure()
@@ -288,41 +893,198 @@ class ModèleCalibré(object):
         except StopIteration:
             raise ValueError(f"Aucune variable disponible dans les données pour groupe {variable.nom}")
 
-    def créer_modèle(soimême):
-        variables = soimême.résoudre_variables()
-        résolues: dict[str, Any] = {}
-        n_non_résolues = len(variables)
-
-        while n_non_résolues > 0:
-            prêtes = [v for v in variables if all(d.nom in résolues for d in soimême.dépendances(v))]
-            for v in prêtes:
-                dépendances = {c: vl for c, vl in résolues.items() if c in [str(x) for x in soimême.dépendances(v)]}
-                résolues[v.nom] = v.générer_variable_pm(
-                    dépendances,
-                    soimême.données.obtenir(v)
-                )
-                variables.remove(v)
+    def modèle_pm(soimême, prédictions: bool = False, équation: Optional[Variable] = None) -> pm.Model:
+        import pymc as pm
 
-            if n_non_résolues == len(variables) != 0:
-                raise ValueError(
-                    f"Connexions circulaires : {', '.join([v.nom for v in variables if v.nom not in résolues])}"
+        hiérarchie = soimême.options["hiérarchie"]
+        if not soimême.options["partager_modèle"]:
+            with pm.Model() as modèle_pm:
+                if prédictions:
+                    soimême.créer_modèle(hiérarchie=hiérarchie, équation=équation)
+                else:
+                    soimême.créer_modèle(
+                        minilots=soimême.options["minilots"], compresser=soimême.options["compresser"],
+                        hiérarchie=hiérarchie, équation=équation
+                    )
+            return modèle_pm
+
+        # Le modèle n'est construit (et compilé) qu'une fois par structure ; on n'y change ensuite que les données
+        clé = soimême.empreinte_modèle_pm(équation)
+        if clé not in soimême.modèle.modèles_pm:
+            with pm.Model() as modèle_pm:
+                soimême.créer_modèle(hiérarchie=hiérarchie, partagées=True, équation=équation)
+            soimême.modèle.modèles_pm[clé] = modèle_pm
+        else:
+            modèle_pm = soimême.modèle.modèles_pm[clé]
+            with modèle_pm:
+                pm.set_data(soimême.données_partagées(équation))
+            if hiérarchie is not None:
+                # Les codes des groupes n'ont pas de dimension ; `set_data` ne changerait donc pas les noms des groupes.
+                # Leur nombre fait partie de l'empreinte du modèle et ne change pas.
+                noms_groupes = soimême.groupes(hiérarchie)[1]
+                modèle_pm.set_dim(hiérarchie, len(noms_groupes), coord_values=noms_groupes)
+        return modèle_pm
+
+    def étape_pm(soimême, modèle_pm: pm.Model, équation: Optional[Variable] = None):
+        import pymc as pm
+
+        clé = soimême.empreinte_modèle_pm(équation)
+        if clé not in soimême.modèle.étapes_pm:
+            with modèle_pm:
+                soimême.modèle.étapes_pm[clé] = pm.NUTS()
+        else:
+            # L'adaptation (taille des pas, matrice de masse) doit recommencer pour les nouvelles données
+            soimême.modèle.étapes_pm[clé].reset_tuning()
+        return soimême.modèle.étapes_pm[clé]
+
+    def empreinte_modèle_pm(soimême, équation: Optional[Variable] = None) -> str:
+        variables = soimême.variables_modèle(équation)
+        contenu = {
+            "relations": soimême.relations_résolues(),
+            "groupes": soimême.groupes_résolus(),
+            "équation": None if équation is None else str(équation),
+            "variables": {str(v): v.configuration() for v in variables},
+            "n_catégories": {
+                str(v): v.n_catégories or len(np.unique(soimême.données.obtenir(v)))
+                for v in variables if isinstance(v, VariableÉchelle)
+            },
+            "n_niveaux": {
+                str(v): int(np.max(soimême.données.obtenir(v))) + 1
+                for v in variables if isinstance(v, VariableCatégorique)
+            },
+            "hiérarchie": soimême.options["hiérarchie"],
+            # Le nombre de groupes fixe la taille des décalages (et donc celle du pas NUTS compilé)
+            "n_groupes": None if soimême.options["hiérarchie"] is None else len(
+                soimême.groupes(soimême.options["hiérarchie"])[1]
+            )
+        }
+        return hashlib.sha256(json.dumps(contenu, sort_keys=True, default=str).encode()).hexdigest()
+
+    def données_partagées(soimême, équation: Optional[Variable] = None) -> dict[str, np.ndarray]:
+        données = {
+            nom_données_partagées(str(v)): soimême.données.obtenir(v) for v in soimême.variables_modèle(équation)
+        }
+        hiérarchie = soimême.options["hiérarchie"]
+        if hiérarchie is not None:
+            données[nom_données_partagées(hiérarchie)] = soimême.groupes(hiérarchie)[0]
+        return données
+
+    def créer_modèle(
+            soimême,
+            minilots: Optional[int] = None,
+            compresser: bool = False,
+            hiérarchie: Optional[str] = None,
+            partagées: bool = False,
+            équation: Optional[Variable] = None
+    ):
+        import pymc as pm
+
+        if minilots and compresser:
+            raise ValueError("La compression des observations n'est pas compatible avec les minilots.")
+        if partagées and (minilots or compresser):
+            raise ValueError("Les données partagées ne sont pas compatibles avec les minilots ou la compression.")
+
+        graphe = soimême.graphe
+        # Pour une équation seule, les parents ne sont que des données observées
+        à_générer = graphe.ordre if équation is None else [équation]
+
+        données = {str(v): soimême.données.obtenir(v) for v in soimême.variables_modèle(équation)}
+        codes_groupes = None
+        if hiérarchie is not None:
+            codes_groupes, noms_groupes = soimême.groupes(hiérarchie)
+            pm.modelcontext(None).add_coord(hiérarchie, noms_groupes, mutable=partagées)
+
+        observées = dict(données)
+        if partagées:
+            observées = {n: pm.MutableData(nom_données_partagées(n), x) for n, x in données.items()}
+            if codes_groupes is not None:
+                codes_groupes = pm.MutableData(nom_données_partagées(hiérarchie), codes_groupes)
+        taille_totale = None
+        if minilots:
+            # Toutes les variables (et les groupes) doivent partager les mêmes lignes dans chaque minilot
+            taille_totale = len(next(iter(données.values())))
+            à_diviser = list(données.values()) + ([] if codes_groupes is None else [codes_groupes])
+            lots = pm.Minibatch(*à_diviser, batch_size=minilots)
+            if not isinstance(lots, (list, tuple)):
+                lots = [lots]
+            observées = dict(zip(données, lots))
+            if codes_groupes is not None:
+                codes_groupes = lots[-1]
+
+        résolues: dict[str, Any] = {n: x for n, x in observées.items() if n not in {str(v) for v in à_générer}}
+        for v in à_générer:
+            parents = graphe.parents[str(v)]
+            if compresser and parents and soimême._compressible(v):
+                # Regrouper les lignes ayant les mêmes valeurs pour la variable, ses parents et son groupe
+                colonnes = [données[str(d)] for d in parents] + [données[str(v)]]
+                if codes_groupes is not None:
+                    colonnes.append(codes_groupes)
+                motifs, comptes = np.unique(np.column_stack(colonnes), axis=0, return_counts=True)
+                v.générer_variable_pm(
+                    {str(d): soimême._valeur_parent(d, données[str(d)], motifs[:, i]) for i, d in enumerate(parents)},
+                    données[str(v)],
+                    observées=motifs[:, len(parents)],
+                    poids=comptes,
+                    groupes=None if codes_groupes is None else (hiérarchie, motifs[:, -1].astype(int))
                 )
+                # Les variables observées sont égales à leurs données pour les variables qui en dépendent
+                résolues[str(v)] = observées[str(v)]
+                continue
 
-            n_non_résolues = len(variables)
+            dépendances = {str(d): soimême._valeur_parent(d, données[str(d)], résolues[str(d)]) for d in parents}
+            résolues[str(v)] = v.générer_variable_pm(
+                dépendances,
+                données[str(v)],
+                observées=observées[str(v)],
+                taille_totale=taille_totale,
+                groupes=None if codes_groupes is None else (hiérarchie, codes_groupes)
+            )
 
-    def dépendances(soimême, variable: Variable) -> list[Variable]:
-        dépendances: list[Variable] = []
-        for r in soimême.modèle.relations:
-            if soimême.résoudre_variable(r.dépendante) is variable:
-                dépendances.append(soimême.résoudre_variable(r.indépendante))
+    def groupes(soimême, hiérarchie: str) -> tuple[np.ndarray, np.ndarray]:
+        if hiérarchie == "région":
+            return soimême.données.régions()
+        elif hiérarchie == "pays":
+            if not isinstance(soimême.données, DonnéesGroupées):
+                raise ValueError("La hiérarchie « pays » nécessite des DonnéesGroupées.")
+            return soimême.données.pays()
+        raise ValueError(f"Hiérarchie {hiérarchie} inconnue.")
+
+    @staticmethod
+    def _valeur_parent(parent: Variable, données: np.ndarray, valeur: Any):
+        # Les variables catégoriques entrent dans les équations par leur matrice de conception
+        if isinstance(parent, VariableCatégorique):
+            return parent.conception(données, valeur)
+        return valeur
 
-        return dépendances
+    def _compressible(soimême, variable: Variable) -> bool:
+        return isinstance(variable, VariableÉchelle) and all(
+            isinstance(d, (VariableÉchelle, VariableCatégorique)) for d in soimême.graphe.parents[str(variable)]
+        )
+
+    def dépendances(soimême, variable: Variable) -> list[Variable]:
+        return list(soimême.graphe.parents[str(variable)])
 
     def résoudre_variables(soimême) -> list[Variable]:
-        variables: list[Variable] = []
+        return list(soimême.graphe.variables)
+
+
+def nom_données_partagées(nom: str) -> str:
+    return 'données_' + nom
+
+
+def répartir_cœurs(n_calibrations: int, chaînes: int, cœurs: Optional[int] = None) -> tuple[int, int]:
+    # Répartir les cœurs disponibles entre les chaînes de chaque calibration et les calibrations simultanées
+    cœurs = cœurs or os.cpu_count() or 1
+    n_travaux = max(1, min(n_calibrations, cœurs // chaînes))
+    return n_travaux, max(1, min(chaînes, cœurs // n_travaux))
+
+
+def _calibrer(mod: ModèleCalibré, cœurs: int) -> str:
+    mod.calibrer(cœurs=cœurs)
+    return mod.obtenir_fichier_calibs()
+
 
-        for r in soimême.modèle.relations:
-            for v in [r.dépendante, r.indépendante]:
-                if (résolue := soimême.résoudre_variable(v)) not in variables:
-                    variables.append(résolue)
-        return variables
+def _calibrer_équation(mod: ModèleCalibré, équation: str, cœurs: int) -> str:
+    variable = next(v for v in mod.graphe.variables if str(v) == équation)
+    mod.calibrer_équation(variable, cœurs=cœurs)
+    return mod.obtenir_fichier_équation(variable)
@@ -0,0 +1,224 @@
+import time
+import warnings
+from typing import Any, Optional
+
+import arviz as az
+import numpy as np
+import pymc as pm
+
+MOTEURS_NUTS = ["pymc", "nutpie", "numpyro", "blackjax"]
+MOTEURS_VARIATIONNELS = ["advi", "pathfinder"]
+MOTEURS = MOTEURS_NUTS + MOTEURS_VARIATIONNELS
+
+# Cibles de convergence pour les coefficients des relations (rel_*) ; `durée_max` (en secondes) borne tous les tours
+CIBLES_CONVERGENCE = {
+    "r_hat": 1.01,
+    "ess_bulk": 400,
+    "ess_tail": 400,
+    "tours_max": 10,
+    "durée_max": None,
+    "ajustement_prolongation": 200
+}
+
+
+def échantillonner(
+        moteur: str,
+        tirages: int,
+        ajustement: int,
+        chaînes: int,
+        graine: Optional[int] = None,
+        cœurs: Optional[int] = None,
+        options_moteur: Optional[dict[str, Any]] = None
+) -> az.InferenceData:
+    # Doit être appelée à l'intérieur du contexte d'un modèle PyMC
+    options_moteur = options_moteur or {}
+
+    if moteur in MOTEURS_NUTS:
+        # nutpie, numpyro et blackjax compilent le modèle (Numba ou JAX) au lieu d'utiliser l'échantillonneur de PyMC
+        return pm.sample(
+            draws=tirages,
+            tune=ajustement,
+            chains=chaînes,
+            random_seed=graine,
+            cores=cœurs,
+            nuts_sampler=moteur,
+            **options_moteur
+        )
+    elif moteur == "advi":
+        approximation = pm.fit(method="advi", random_seed=graine, **{"n": 30000, **options_moteur})
+        return approximation.sample(draws=tirages, random_seed=graine)
+    elif moteur == "pathfinder":
+        try:
+            import pymc_experimental as pmx
+        except ImportError:
+            raise ImportError("Le moteur « pathfinder » nécessite pymc_experimental.")
+        return pmx.fit(method="pathfinder", num_draws=tirages, random_seed=graine, **options_moteur)
+
+    raise ValueError(f"Moteur {moteur} inconnu. Les moteurs disponibles sont : {', '.join(MOTEURS)}")
+
+
+def échantillonner_adaptatif(
+        moteur: str,
+        tirages: int,
+        ajustement: int,
+        chaînes: int,
+        graine: Optional[int] = None,
+        cœurs: Optional[int] = None,
+        options_moteur: Optional[dict[str, Any]] = None,
+        cibles: Optional[dict[str, Any]] = None
+) -> az.InferenceData:
+    # Échantillonne par tours de `tirages` tirages jusqu'à ce que les cibles de convergence soient atteintes. Chaque
+    # nouveau tour repart des derniers tirages de chaque chaîne, avec un court ajustement, et prolonge les chaînes.
+    if moteur not in MOTEURS_NUTS:
+        raise ValueError(f"L'échantillonnage adaptatif n'est disponible qu'avec les moteurs {', '.join(MOTEURS_NUTS)}.")
+    cibles = {**CIBLES_CONVERGENCE, **(cibles or {})}
+    modèle = pm.modelcontext(None)
+
+    début = time.perf_counter()
+    trace = échantillonner(moteur, tirages, ajustement, chaînes, graine, cœurs, options_moteur)
+    tours = [diagnostics_convergence(trace, cibles)]
+    while not tours[-1]["atteinte"] and len(tours) < cibles["tours_max"]:
+        écoulée = time.perf_counter() - début
+        if cibles["durée_max"] is not None and écoulée * (len(tours) + 1) / len(tours) > cibles["durée_max"]:
+            break
+
+        valeurs_initiales = [
+            {v.name: trace.posterior[v.name].isel(chain=c, draw=-1).values for v in modèle.free_RVs}
+            for c in range(trace.posterior.sizes["chain"])
+        ]
+        suite = échantillonner(
+            moteur, tirages, cibles["ajustement_prolongation"], chaînes,
+            graine=None if graine is None else graine + len(tours),
+            cœurs=cœurs,
+            options_moteur={**(options_moteur or {}), "initvals": valeurs_initiales}
+        )
+        trace = prolonger(trace, suite)
+        tours.append(diagnostics_convergence(trace, cibles))
+
+    noter_convergence(trace, tours[-1], n_tours=len(tours))
+    return trace
+
+
+def diagnostics_convergence(trace: az.InferenceData, cibles: Optional[dict[str, Any]] = None) -> dict[str, Any]:
+    cibles = {**CIBLES_CONVERGENCE, **(cibles or {})}
+    postérieur = trace.posterior
+    variables = [v for v in postérieur.data_vars if v.startswith("rel_")] or list(postérieur.data_vars)
+
+    def extrêmes(diagnostic: Any, f) -> float:
+        valeurs = np.concatenate([np.ravel(x.values) for x in diagnostic.data_vars.values()])
+        valeurs = valeurs[np.isfinite(valeurs)]
+        return float(f(valeurs)) if valeurs.size else float("nan")
+
+    # Le R-hat n'est pas défini avec une seule chaîne
+    r_hat = extrêmes(az.rhat(postérieur[variables]), np.max) if postérieur.sizes["chain"] > 1 else float("nan")
+    ess_bulk = extrêmes(az.ess(postérieur[variables], method="bulk"), np.min)
+    ess_tail = extrêmes(az.ess(postérieur[variables], method="tail"), np.min)
+    return {
+        "r_hat": r_hat,
+        "ess_bulk": ess_bulk,
+        "ess_tail": ess_tail,
+        "tirages": int(postérieur.sizes["draw"]),
+        "atteinte": int(
+            (np.isnan(r_hat) or r_hat <= cibles["r_hat"])
+            and ess_bulk >= cibles["ess_bulk"] and ess_tail >= cibles["ess_tail"]
+        )
+    }
+
+
+def noter_convergence(trace: az.InferenceData, diagnostic: dict[str, Any], n_tours: int = 1):
+    # Les diagnostics sont sauvegardés avec la calibration, comme ceux de l'ELBO (voir ajuster_minilots)
+    trace.posterior.attrs.update({f"convergence_{c}": v for c, v in diagnostic.items()})
+    trace.posterior.attrs["convergence_tours"] = n_tours
+    if not diagnostic["atteinte"]:
+        warnings.warn(
+            f"Les cibles de convergence n'ont pas été atteintes après {diagnostic['tirages']} tirages "
+            f"(R-hat max {diagnostic['r_hat']:.3g}, ESS bulk min {diagnostic['ess_bulk']:.0f}, "
+            f"ESS tail min {diagnostic['ess_tail']:.0f})."
+        )
+
+
+def prolonger(trace: az.InferenceData, suite: az.InferenceData) -> az.InferenceData:
+    # Ajoute les tirages de `suite` à la fin des chaînes de `trace`
+    import xarray as xr
+
+    n_tirages = trace.posterior.sizes["draw"]
+    groupes = {}
+    for groupe in trace.groups():
+        ensemble = getattr(trace, groupe)
+        if "draw" in ensemble.dims and groupe in suite.groups():
+            nouveaux = getattr(suite, groupe)
+            nouveaux = nouveaux.assign_coords(draw=nouveaux["draw"] + n_tirages)
+            ensemble = xr.concat([ensemble, nouveaux], dim="draw", combine_attrs="override")
+        groupes[groupe] = ensemble
+    return az.InferenceData(**groupes)
+
+
+def ajuster_minilots(
+        tirages: int,
+        graine: Optional[int] = None,
+        options_moteur: Optional[dict[str, Any]] = None,
+        tolérance_elbo: float = 0.01
+) -> az.InferenceData:
+    # ADVI sur un modèle dont les observations sont des pm.Minibatch (voir ModèleCalibré.créer_modèle)
+    options_moteur = {"n": 50000, **(options_moteur or {})}
+    approximation = pm.fit(
+        method="advi",
+        random_seed=graine,
+        callbacks=[pm.callbacks.CheckParametersConvergence(diff="relative", tolerance=1e-3)],
+        **options_moteur
+    )
+    trace = approximation.sample(draws=tirages, random_seed=graine)
+
+    diagnostic = diagnostic_elbo(approximation.hist, tolérance=tolérance_elbo)
+    trace.posterior.attrs.update({f"elbo_{c}": v for c, v in diagnostic.items()})
+    if not diagnostic["convergée"]:
+        warnings.warn(
+            f"L'ELBO n'a pas convergé (variation relative de {diagnostic['variation_relative']:.3g}). "
+            f"Augmentez le nombre d'itérations (options_moteur={{'n': ...}})."
+        )
+    return trace
+
+
+def diagnostic_elbo(historique: np.ndarray, tolérance: float = 0.01, fraction: float = 0.1) -> dict[str, Any]:
+    # Compare la perte moyenne des dernières itérations à celle de la fenêtre précédente
+    historique = np.asarray(historique)
+    n_fenêtre = max(1, int(len(historique) * fraction))
+    if len(historique) < 2 * n_fenêtre:
+        return {"final": float(historique[-1]), "variation_relative": float("inf"), "convergée": 0}
+
+    dernière = historique[-n_fenêtre:].mean()
+    précédente = historique[-2 * n_fenêtre:-n_fenêtre].mean()
+    variation = abs(dernière - précédente) / abs(précédente)
+    return {
+        "final": float(-dernière),
+        "variation_relative": float(variation),
+        "convergée": int(variation < tolérance)
+    }
+
+
+def assembler_équations(traces: dict[str, az.InferenceData]) -> az.InferenceData:
+    # Les équations calibrées séparément n'ont aucun paramètre en commun ; leurs postérieurs peuvent être fusionnés
+    import xarray as xr
+
+    # Avec l'échantillonnage adaptatif, les équations n'ont pas toutes le même nombre de tirages ; on garde les derniers
+    n_tirages = min(t.posterior.sizes["draw"] for t in traces.values())
+
+    def derniers_tirages(ensemble):
+        if "draw" not in ensemble.dims:
+            return ensemble
+        return ensemble.isel(draw=slice(-n_tirages, None)).assign_coords(draw=np.arange(n_tirages))
+
+    groupes = {}
+    for groupe in ["posterior", "observed_data", "log_likelihood"]:
+        ensembles = [derniers_tirages(getattr(t, groupe)) for t in traces.values() if groupe in t.groups()]
+        if ensembles:
+            groupes[groupe] = xr.merge(ensembles, combine_attrs="drop_conflicts")
+
+    # Les statistiques de l'échantillonneur (divergences, etc.) portent les mêmes noms pour chaque équation
+    stats = [derniers_tirages(t.sample_stats) for t in traces.values() if "sample_stats" in t.groups()]
+    if stats and len(stats) == len(traces):
+        groupes["sample_stats"] = xr.concat(
+            stats, dim="équation", join="outer", combine_attrs="drop_conflicts"
+        ).assign_coords(équation=list(traces))
+
+    return az.InferenceData(**groupes)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import functools
+import io
+import json
+import time
+from contextlib import contextmanager
+from typing import Any, Optional, TYPE_CHECKING
+
+import numpy as np
+
+from .stockage import base_fichier
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+if TYPE_CHECKING:
+    import arviz as az
+    import pymc as pm
+
+
+def mémoire_max() -> Optional[float]:
+    # Mémoire résidente maximale (Mo) du processus et de ses sous-processus (p. ex., chaînes de PyMC)
+    if resource is None:
+        return None
+    processus = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    enfants = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return (processus + enfants) / 1024
+
+
+class Profileur(object):
+    def __init__(soimême):
+        soimême.phases: dict[str, dict[str, Any]] = {}
+        soimême.diagnostics: dict[str, Any] = {}
+        soimême.profils_graphe: dict[str, str] = {}
+
+    @contextmanager
+    def phase(soimême, nom: str):
+        début = time.perf_counter()
+        try:
+            yield
+        finally:
+            durée = time.perf_counter() - début
+            phase = soimême.phases.setdefault(nom, {"n": 0, "durée": 0., "durée_max": 0.})
+            phase["n"] += 1
+            phase["durée"] += durée
+            phase["durée_max"] = max(phase["durée_max"], durée)
+            # ru_maxrss ne peut être remis à zéro : il s'agit du maximum atteint par le processus jusqu'à la fin de la
+            # phase, et non de la mémoire utilisée par la phase elle-même
+            phase["mémoire_max_processus_mo"] = mémoire_max()
+
+    def sauvegarder(soimême, fichier: str):
+        with open(fichier, 'w', encoding='utf8') as d:
+            json.dump({
+                "phases": soimême.phases,
+                "diagnostics": soimême.diagnostics,
+                "profils_graphe": soimême.profils_graphe
+            }, d, ensure_ascii=False, indent=2, default=str)
+
+    def vider(soimême):
+        soimême.phases.clear()
+        soimême.diagnostics.clear()
+        soimême.profils_graphe.clear()
+
+
+def profiler(nom: str):
+    # Pour les méthodes d'objets ayant un attribut `profil` (Profileur)
+    def décorateur(f):
+        @functools.wraps(f)
+        def enveloppe(soimême, *args, **kwargs):
+            with soimême.profil.phase(nom):
+                return f(soimême, *args, **kwargs)
+
+        return enveloppe
+
+    return décorateur
+
+
+def diagnostics_échantillonnage(trace: az.InferenceData, durée: float) -> dict[str, Any]:
+    import arviz as az
+
+    diagnostics: dict[str, Any] = {"durée_échantillonnage": durée}
+    stats = getattr(trace, "sample_stats", None)
+    if stats is not None:
+        if "n_steps" in stats:
+            diagnostics["évaluations_gradient"] = int(stats["n_steps"].sum())
+        if "diverging" in stats:
+            diagnostics["divergences"] = int(stats["diverging"].sum())
+        if "sampling_time" in stats.attrs:
+            diagnostics["durée_tirages"] = float(stats.attrs["sampling_time"])
+
+    convergence = {
+        c[len("convergence_"):]: v for c, v in trace.posterior.attrs.items() if c.startswith("convergence_")
+    }
+    if convergence:
+        diagnostics["convergence"] = convergence
+
+    ess = az.ess(trace)
+    diagnostics["ess_par_seconde"] = {
+        v: float(np.min(ess[v].values)) / durée for v in ess.data_vars
+    }
+    return diagnostics
+
+
+def profiler_graphe(modèle: pm.Model, n_appels: int = 100) -> dict[str, str]:
+    # Utilise pm.Model.profile pour détailler le temps passé dans chaque opération de logp et de son gradient
+    profils = {}
+    for nom, sortie in [("logp", modèle.logp()), ("dlogp", modèle.dlogp())]:
+        texte = io.StringIO()
+        modèle.profile(sortie, n=n_appels).summary(file=texte)
+        profils[nom] = texte.getvalue()
+    return profils
+
+
+def fichier_profil(fichier_calibs: str) -> str:
+    return base_fichier(fichier_calibs) + '.profil.json'
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Optional, Sequence, TypedDict
+
+import numpy as np
+
+from .effets import RésuméDistribution, résumer_distribution
+from .graphe import GrapheCausal
+from .magasin import MagasinCalibrations
+from .stockage import lire_groupe
+from .variables.relation import Relation
+from .variables.variable import nom_coefficient_relation
+
+# Ce module ne doit importer ni PyMC ni ArviZ, afin que les requêtes en ligne de commande restent rapides
+
+
+class RésuméCheminement(TypedDict):
+    cheminement: list[str]
+    résumé: RésuméDistribution
+
+
+class RésultatRequête(TypedDict):
+    fichier: str
+    date: str
+    cheminements: list[RésuméCheminement]
+    total: Optional[RésuméDistribution]
+
+
+def dernière_calibration(magasin: MagasinCalibrations, modèle: str, données: str) -> dict[str, Any]:
+    entrées = magasin.chercher(modèle=modèle, données=données)
+    if not entrées:
+        raise ValueError(f"Aucune calibration disponible pour modèle {modèle} et données {données}.")
+    return max(entrées.values(), key=lambda e: e.get("date", ""))
+
+
+def graphe_entrée(entrée: dict[str, Any]) -> GrapheCausal:
+    # Les variables sont représentées par leurs noms ; ceux-ci suffisent pour nommer les coefficients
+    return GrapheCausal([Relation(de, à) for de, à in entrée["relations"]], résoudre=lambda v: v)
+
+
+def requête(
+        modèle: str,
+        données: str,
+        indépendante: str,
+        dépendante: str,
+        racine: str = 'résultats',
+        quantiles: Sequence[float] = (0.025, 0.5, 0.975),
+        prob_hdi: float = 0.94,
+        pas_tirages: Optional[int] = None
+) -> RésultatRequête:
+    magasin = MagasinCalibrations(os.path.join(racine, 'calibs'))
+    entrée = dernière_calibration(magasin, modèle, données)
+    groupes = entrée.get("groupes", {})
+    indépendante, dépendante = groupes.get(indépendante, indépendante), groupes.get(dépendante, dépendante)
+
+    graphe = graphe_entrée(entrée)
+    for v in [indépendante, dépendante]:
+        if v not in graphe:
+            raise ValueError(f"Variable {v} absente du modèle {modèle}.")
+    cheminements = graphe.cheminements(indépendante, dépendante)
+
+    # On ne lit que les coefficients des relations sur les cheminements
+    fichier = magasin.chemin(entrée)
+    postérieur = lire_groupe(fichier, variables={
+        nom_coefficient_relation(de, à) for ch in cheminements for de, à in zip(ch[:-1], ch[1:])
+    }, pas_tirages=pas_tirages)
+
+    résumés: list[RésuméCheminement] = []
+    total = None
+    for cheminement in cheminements:
+        valeurs = np.ones(1)
+        for de, à in zip(cheminement[:-1], cheminement[1:]):
+            coefficient = postérieur[nom_coefficient_relation(de, à)]
+            if coefficient.ndim > 2:
+                raise ValueError(
+                    f"Le coefficient {coefficient.name} a une valeur par niveau (variable catégorique). "
+                    f"Utilisez plutôt ModèleCalibré.scénarios."
+                )
+            valeurs = valeurs * coefficient.values.ravel()
+        total = valeurs.copy() if total is None else total + valeurs
+        résumés.append(RésuméCheminement(
+            cheminement=list(cheminement), résumé=résumer_distribution(valeurs, quantiles, prob_hdi)
+        ))
+
+    return RésultatRequête(
+        fichier=fichier,
+        date=entrée.get("date", ""),
+        cheminements=résumés,
+        total=None if total is None else résumer_distribution(total, quantiles, prob_hdi)
+    )
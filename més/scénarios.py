@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+from typing import Any, Optional, TypedDict, Union, TYPE_CHECKING
+
+import numpy as np
+
+from .variables import VariableCatégorique
+from .variables.variable import nom_coefficient_groupé, nom_coefficient_relation
+
+if TYPE_CHECKING:
+    from .variables import GroupeVars, Variable
+
+TAILLE_BLOC_SCÉNARIOS = 2 ** 24
+
+
+class Intervention(object):
+    def __init__(
+            soimême,
+            variable: Union[GroupeVars, Variable],
+            delta: Optional[Any] = None,
+            valeur: Optional[Any] = None,
+            masque: Optional[np.ndarray] = None
+    ):
+        # `delta` et `valeur` sont exprimés dans les unités des données brutes ; `masque` indique les lignes touchées
+        if (delta is None) == (valeur is None):
+            raise ValueError("Une intervention doit spécifier soit un `delta`, soit une `valeur`.")
+        soimême.variable = variable
+        soimême.delta = delta
+        soimême.valeur = valeur
+        soimême.masque = masque
+
+
+class EffetsScénarios(TypedDict):
+    scénarios: list[str]
+    variables: list[str]
+    # Changement moyen (sur l'échelle des données préparées) par rapport au scénario de base, de forme
+    # (scénario, tirage) ou, pour les variables catégoriques, (scénario, tirage, niveau)
+    effets: dict[str, np.ndarray]
+
+
+def paramètres_nécessaires(
+        à_propager: list[Variable], parents: dict[str, list[Variable]], dim_groupes: Optional[str] = None
+) -> list[str]:
+    noms = []
+    for v in à_propager:
+        for p in parents[str(v)]:
+            nom = nom_coefficient_relation(p, v)
+            noms.append(nom if dim_groupes is None else nom_coefficient_groupé(nom, dim_groupes))
+        noms.extend(v.paramètres_lien())
+    return noms
+
+
+def propager_scénarios(
+        ordre: list[Variable],
+        parents: dict[str, list[Variable]],
+        à_propager: set[str],
+        valeurs: dict[str, np.ndarray],
+        fixées: dict[str, tuple[np.ndarray, np.ndarray]],
+        paramètres: dict[str, np.ndarray],
+        n_scénarios: int,
+        n_tirages: int,
+        codes_groupes: Optional[np.ndarray] = None,
+        dim_groupes: Optional[str] = None,
+        lignes: Optional[np.ndarray] = None,
+        taille_bloc: int = TAILLE_BLOC_SCÉNARIOS
+) -> dict[str, np.ndarray]:
+    # `valeurs` : données préparées de chaque variable, de forme (ligne,) ou, pour les variables catégoriques,
+    # (ligne, niveau) en codage disjonctif. `fixées` : pour chaque variable modifiée, le masque (scénario, ligne)
+    # des interventions et les valeurs imposées. Le scénario 0 est le scénario de base, sans intervention.
+    # Les variables de `à_propager` prennent leur valeur attendue selon leurs parents, dans l'ordre topologique ;
+    # les autres gardent leurs valeurs observées.
+    n_lignes = len(next(iter(valeurs.values())))
+    n_niveaux = max([x.shape[-1] for x in valeurs.values() if x.ndim > 1] or [1])
+    tirages_bloc = max(1, taille_bloc // (n_scénarios * n_lignes * n_niveaux ** 2))
+
+    # Valeurs qui ne dépendent pas des tirages : (1, scénario, ligne[, niveau])
+    fixes = {}
+    for v in ordre:
+        x = valeurs[str(v)][None, None]
+        if str(v) in fixées:
+            masque, imposées = fixées[str(v)]
+            x = np.where(_étendre(masque, x.ndim - 1)[None], imposées[None], x)
+        fixes[str(v)] = x
+
+    modifiées = [v for v in ordre if str(v) in à_propager or str(v) in fixées]
+    blocs: dict[str, list[np.ndarray]] = {str(v): [] for v in modifiées}
+    for début in range(0, n_tirages, tirages_bloc):
+        tranche = slice(début, début + tirages_bloc)
+        bloc = dict(fixes)
+        for v in ordre:
+            if str(v) not in à_propager:
+                continue
+            mu = _prédicteur(v, parents[str(v)], bloc, paramètres, tranche, codes_groupes, dim_groupes)
+            x = v.espérance(mu, {n: paramètres[n][tranche] for n in v.paramètres_lien()})
+            if str(v) in fixées:
+                masque, imposées = fixées[str(v)]
+                x = np.where(_étendre(masque, x.ndim - 1)[None], imposées[None], x)
+            bloc[str(v)] = x
+
+        n_bloc = len(range(n_tirages)[tranche])
+        for v in modifiées:
+            x = bloc[str(v)]
+            différences = x[:, 1:] - x[:, :1]
+            if lignes is not None:
+                différences = différences[:, :, lignes]
+            # Les variables qui ne sont pas propagées n'ont pas de dimension de tirage
+            moyennes = différences.mean(axis=2)
+            blocs[str(v)].append(np.broadcast_to(moyennes, (n_bloc, *moyennes.shape[1:])))
+
+    return {v: np.moveaxis(np.concatenate(b, axis=0), 0, 1) for v, b in blocs.items()}
+
+
+def _prédicteur(
+        variable: Variable,
+        parents: list[Variable],
+        valeurs: dict[str, np.ndarray],
+        paramètres: dict[str, np.ndarray],
+        tranche: slice,
+        codes_groupes: Optional[np.ndarray],
+        dim_groupes: Optional[str]
+) -> np.ndarray:
+    # Même prédicteur linéaire que Variable.générer_mu, avec les valeurs (ou valeurs attendues) des parents
+    sorties = isinstance(variable, VariableCatégorique)
+    mu = 0
+    for p in parents:
+        nom = nom_coefficient_relation(p, variable)
+        if dim_groupes is not None:
+            nom = nom_coefficient_groupé(nom, dim_groupes)
+        coefficients = _lignes(paramètres[nom][tranche], codes_groupes)
+        x = valeurs[str(p)]
+        if isinstance(p, VariableCatégorique):
+            x = _conception(x, p.codage)
+            mu = mu + ((x[..., None] * coefficients).sum(axis=-2) if sorties else (x * coefficients).sum(axis=-1))
+        else:
+            mu = mu + (x[..., None] * coefficients if sorties else x * coefficients)
+    return mu
+
+
+def _lignes(coefficients: np.ndarray, codes_groupes: Optional[np.ndarray]) -> np.ndarray:
+    # (tirage, ...) -> (tirage, 1, 1, ...) ou, par groupe, (tirage, groupe, ...) -> (tirage, 1, ligne, ...)
+    if codes_groupes is None:
+        return coefficients[:, None, None]
+    return coefficients[:, codes_groupes][:, None]
+
+
+def _conception(probabilités: np.ndarray, codage: str) -> np.ndarray:
+    # Colonnes de la matrice de conception (voir ConceptionCatégorique), sans le niveau de référence
+    if codage == "effets":
+        return probabilités[..., 1:] - probabilités[..., :1]
+    return probabilités[..., 1:]
+
+
+def _étendre(masque: np.ndarray, n_dims: int) -> np.ndarray:
+    return masque.reshape(masque.shape + (1,) * (n_dims - masque.ndim))
+
+
+def disjonctif(codes: np.ndarray, n_niveaux: int) -> np.ndarray:
+    return np.eye(n_niveaux)[codes]
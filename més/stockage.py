@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import os
+from typing import Any, Iterable, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import arviz as az
+    import xarray as xr
+
+# Les calibrations Zarr sont gardées dans un seul fichier zip, comme les fichiers NetCDF
+EXTENSIONS_FORMATS = {"netcdf": ".ncdf", "zarr": ".zarr.zip"}
+
+
+def extension_format(format_stockage: str) -> str:
+    try:
+        return EXTENSIONS_FORMATS[format_stockage]
+    except KeyError:
+        raise ValueError(
+            f"Format {format_stockage} inconnu. Les formats disponibles sont : {', '.join(EXTENSIONS_FORMATS)}"
+        )
+
+
+def format_fichier(fichier: str) -> str:
+    return next((f for f, ext in EXTENSIONS_FORMATS.items() if fichier.endswith(ext)), "netcdf")
+
+
+def base_fichier(fichier: str) -> str:
+    # Nom du fichier sans son extension, y compris pour les extensions doubles (.zarr.zip)
+    extension = EXTENSIONS_FORMATS[format_fichier(fichier)]
+    return fichier[:-len(extension)] if fichier.endswith(extension) else os.path.splitext(fichier)[0]
+
+
+def écrire_calibration(
+        trace: az.InferenceData,
+        fichier: str,
+        float32: bool = False,
+        compression: Optional[int] = None,
+        morceaux_tirages: Optional[int] = None
+):
+    import arviz as az
+
+    format_stockage = format_fichier(fichier)
+    if format_stockage == "netcdf" and not (float32 or compression or morceaux_tirages):
+        az.to_netcdf(trace, fichier)
+        return
+
+    # Chaque variable (rel_*, b_*, ét_*, divisions_*, etc.) est un tableau séparé, découpé en morceaux de tirages, qui
+    # peut donc être lu seul et en partie
+    groupes = {g: _réduire_précision(getattr(trace, g)) if float32 else getattr(trace, g) for g in trace.groups()}
+    if format_stockage == "netcdf":
+        for i, (groupe, ensemble) in enumerate(groupes.items()):
+            ensemble.to_netcdf(
+                fichier, mode="w" if i == 0 else "a", group=groupe,
+                encoding={v: _encodage_netcdf(ensemble[v], compression, morceaux_tirages) for v in ensemble.data_vars}
+            )
+    else:
+        import zarr
+
+        magasin = zarr.storage.ZipStore(fichier, mode="w")
+        try:
+            for groupe, ensemble in groupes.items():
+                ensemble.to_zarr(
+                    magasin, group=groupe, mode="w-",
+                    encoding={v: _encodage_zarr(ensemble[v], compression, morceaux_tirages) for v in ensemble.data_vars}
+                )
+        finally:
+            magasin.close()
+
+
+def lire_calibration(fichier: str) -> tuple[az.InferenceData, Optional[Any]]:
+    import arviz as az
+
+    # Les variables ne sont lues du disque que lorsqu'on y accède. Pour le format Zarr, le magasin zip doit donc rester
+    # ouvert ; il est renvoyé avec la calibration afin d'être fermé lorsque celle-ci n'est plus utilisée.
+    if format_fichier(fichier) == "zarr":
+        import zarr
+
+        magasin = zarr.storage.ZipStore(fichier, mode="r")
+        try:
+            return az.from_zarr(magasin), magasin
+        except Exception:
+            magasin.close()
+            raise
+    with az.rc_context({"data.load": "lazy"}):
+        return az.from_netcdf(fichier), None
+
+
+def lire_groupe(
+        fichier: str,
+        groupe: str = "posterior",
+        variables: Optional[Iterable[str]] = None,
+        pas_tirages: Optional[int] = None
+) -> xr.Dataset:
+    # Ne lit que les variables demandées et, si `pas_tirages` est spécifié, un tirage sur `pas_tirages`
+    import xarray as xr
+
+    magasin = None
+    if format_fichier(fichier) == "zarr":
+        import zarr
+
+        magasin = zarr.storage.ZipStore(fichier, mode="r")
+        ensemble = xr.open_zarr(magasin, group=groupe)
+    else:
+        ensemble = xr.open_dataset(fichier, group=groupe)
+
+    try:
+        sélection = ensemble if variables is None else ensemble[list(variables)]
+        if pas_tirages is not None:
+            sélection = sélection.isel(draw=slice(None, None, pas_tirages))
+        return sélection.load()
+    finally:
+        ensemble.close()
+        if magasin is not None:
+            magasin.close()
+
+
+def _réduire_précision(ensemble: xr.Dataset) -> xr.Dataset:
+    return ensemble.assign({v: x.astype("float32") for v, x in ensemble.data_vars.items() if x.dtype == "float64"})
+
+
+def _morceaux(variable: xr.DataArray, morceaux_tirages: Optional[int]) -> Optional[tuple[int, ...]]:
+    if not morceaux_tirages or "draw" not in variable.dims:
+        return None
+    return tuple(min(morceaux_tirages, n) if d == "draw" else n for d, n in zip(variable.dims, variable.shape))
+
+
+def _encodage_netcdf(
+        variable: xr.DataArray, compression: Optional[int], morceaux_tirages: Optional[int]
+) -> dict[str, Any]:
+    encodage: dict[str, Any] = {}
+    if compression:
+        encodage.update(zlib=True, complevel=compression, shuffle=True)
+    morceaux = _morceaux(variable, morceaux_tirages)
+    if morceaux is not None:
+        encodage["chunksizes"] = morceaux
+    return encodage
+
+
+def _encodage_zarr(
+        variable: xr.DataArray, compression: Optional[int], morceaux_tirages: Optional[int]
+) -> dict[str, Any]:
+    encodage: dict[str, Any] = {}
+    if compression:
+        from numcodecs import Blosc
+
+        encodage["compressor"] = Blosc(cname="zstd", clevel=compression, shuffle=Blosc.BITSHUFFLE)
+    morceaux = _morceaux(variable, morceaux_tirages)
+    if morceaux is not None:
+        encodage["chunks"] = morceaux
+    return encodage
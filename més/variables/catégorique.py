@@ -1,22 +1,140 @@
-from typing import Any, Optional
+from __future__ import annotations
 
+from typing import Any, Optional, TYPE_CHECKING
+
+import numpy as np
 import pandas as pd
-import pymc as pm
 
 from .variable import Variable
 
+if TYPE_CHECKING:
+    import scipy.sparse as sp
+
+CODAGES = ["traitement", "effets"]
+
 
 class VariableCatégorique(Variable):
-    def __init__(soimême, nom):
+    def __init__(soimême, nom, codage: str = "traitement"):
         super().__init__(nom)
+        if codage not in CODAGES:
+            raise ValueError(f"Codage {codage} inconnu. Les codages disponibles sont : {', '.join(CODAGES)}")
+        soimême.codage = codage
+
+    def générer_variable_pm(
+            soimême,
+            dépendances: dict[str, Any],
+            données: Optional[pd.Series],
+            observées: Optional[Any] = None,
+            taille_totale: Optional[int] = None,
+            groupes: Optional[tuple[str, Any]] = None
+    ):
+        import pymc as pm
+        import pytensor.tensor as pt
 
-    def générer_variable_pm(soimême, dépendances: dict[str, Any], données: Optional[pd.Series]):
+        observées = données if observées is None else observées
         if not dépendances:
-            return données
-        mu = soimême.générer_mu(dépendances)
+            return observées
+
+        # Logit multinomial : un prédicteur linéaire par niveau, le premier niveau servant de référence
+        dim = soimême.dim_niveaux()
+        soimême.ajouter_coords_niveaux(données)
+        mu = soimême.générer_mu(dépendances, groupes=groupes, dim_sorties=dim)
 
-        ét = pm.HalfNormal(name='ét_' + soimême.nom, sigma=10)
         b = pm.Normal(
-            name='b_' + soimême.nom, mu=0, sigma=100
+            name='b_' + soimême.nom, mu=0, sigma=100, dims=dim
+        )
+        logits = pt.concatenate([pt.zeros_like(mu[:, :1]), mu + b], axis=1)
+        return pm.Categorical(name=soimême.nom, logit_p=logits, observed=observées, total_size=taille_totale)
+
+    def transformer(soimême, valeurs: pd.Series, référence: pd.Series):
+        niveaux = pd.factorize(référence, sort=True)[1]
+        return pd.Categorical(valeurs, categories=niveaux).codes.astype(np.int32)
+
+    def paramètres_lien(soimême) -> list[str]:
+        return ['b_' + soimême.nom]
+
+    def espérance(soimême, mu: np.ndarray, paramètres: dict[str, np.ndarray]) -> np.ndarray:
+        from scipy.special import softmax
+
+        # Probabilités de chaque niveau : mu est de forme (tirage, ..., niveau), sans le niveau de référence
+        b = paramètres['b_' + soimême.nom]
+        logits = mu + b.reshape(b.shape[:1] + (1,) * (mu.ndim - 2) + b.shape[1:])
+        return softmax(np.concatenate([np.zeros_like(logits[..., :1]), logits], axis=-1), axis=-1)
+
+    def conception(soimême, données: np.ndarray, observées: Optional[Any] = None) -> ConceptionCatégorique:
+        observées = données if observées is None else observées
+        soimême.ajouter_coords_niveaux(données)
+        return ConceptionCatégorique(
+            observées, n_niveaux=n_niveaux(données), dim=soimême.dim_niveaux(), codage=soimême.codage
+        )
+
+    def dim_niveaux(soimême) -> str:
+        return 'niveaux_' + soimême.nom
+
+    def ajouter_coords_niveaux(soimême, données: np.ndarray):
+        import pymc as pm
+
+        modèle = pm.modelcontext(None)
+        if soimême.dim_niveaux() not in modèle.coords:
+            modèle.add_coord(soimême.dim_niveaux(), [str(k) for k in range(1, n_niveaux(données))])
+
+
+class ConceptionCatégorique(object):
+    def __init__(soimême, codes: Any, n_niveaux: int, dim: str, codage: str):
+        soimême.codes = codes.astype(int) if isinstance(codes, np.ndarray) else codes
+        soimême.n_niveaux = n_niveaux
+        soimême.dim = dim
+        soimême.codage = codage
+
+    def matrice(soimême) -> sp.csr_matrix:
+        import pytensor
+        import scipy.sparse as sp
+
+        # Matrice creuse (ligne, niveau), sans colonne pour le niveau de référence
+        codes = soimême.codes
+        lignes = np.flatnonzero(codes > 0)
+        colonnes = codes[lignes] - 1
+        valeurs = np.ones(len(lignes))
+        if soimême.codage == "effets":
+            référence = np.flatnonzero(codes == 0)
+            lignes = np.concatenate([lignes, np.repeat(référence, soimême.n_niveaux - 1)])
+            colonnes = np.concatenate([colonnes, np.tile(np.arange(soimême.n_niveaux - 1), len(référence))])
+            valeurs = np.concatenate([valeurs, -np.ones(len(référence) * (soimême.n_niveaux - 1))])
+        return sp.csr_matrix(
+            (valeurs, (lignes, colonnes)), shape=(len(codes), soimême.n_niveaux - 1), dtype=pytensor.config.floatX
         )
-        return pm.Categorical(name=soimême.nom, mu=mu + b, sigma=ét, observed=données)
+
+    def produit(soimême, coefficients):
+        import pytensor
+        import pytensor.sparse as ps
+        import pytensor.tensor as pt
+
+        if isinstance(soimême.codes, np.ndarray):
+            matrice = ps.as_sparse_variable(soimême.matrice())
+            if coefficients.ndim == 1:
+                return ps.structured_dot(matrice, coefficients[:, None])[:, 0]
+            return ps.structured_dot(matrice, coefficients)
+
+        # Codes symboliques (minilots ou données partagées) : la matrice ne peut être construite d'avance
+        niveaux = pt.arange(1, soimême.n_niveaux)
+        conception = pt.cast(pt.eq(soimême.codes[:, None], niveaux[None, :]), pytensor.config.floatX)
+        if soimême.codage == "effets":
+            conception = conception - pt.cast(pt.eq(soimême.codes, 0), pytensor.config.floatX)[:, None]
+        return pt.dot(conception, coefficients)
+
+    def produit_groupé(soimême, coefficients_groupes, codes_groupes):
+        import pytensor.tensor as pt
+
+        # coefficients_groupes : (groupe, niveau, ...) ; on indexe directement plutôt que de multiplier
+        codes = pt.as_tensor_variable(soimême.codes)
+        termes = coefficients_groupes[codes_groupes, pt.maximum(codes - 1, 0)]
+        masque = pt.shape_padright(pt.gt(codes, 0), termes.ndim - 1)
+        if soimême.codage == "effets":
+            référence = -coefficients_groupes[codes_groupes].sum(axis=1)
+        else:
+            référence = pt.zeros_like(termes)
+        return pt.where(masque, termes, référence)
+
+
+def n_niveaux(données: np.ndarray) -> int:
+    return int(np.max(données)) + 1
@@ -1,8 +1,8 @@
 from numbers import Number
 from typing import Optional, Any
 
+import numpy as np
 import pandas as pd
-import pymc as pm
 
 from .variable import Variable
 
@@ -11,38 +11,74 @@ class VariableContinue(Variable):
     def __init__(soimême, nom):
         super().__init__(nom)
 
-    def générer_variable_pm(soimême, dépendances: dict[str, Any], données: Optional[pd.Series]):
+    def générer_variable_pm(
+            soimême,
+            dépendances: dict[str, Any],
+            données: Optional[pd.Series],
+            observées: Optional[Any] = None,
+            taille_totale: Optional[int] = None,
+            groupes: Optional[tuple[str, Any]] = None
+    ):
+        import pymc as pm
+
+        observées = données if observées is None else observées
         if not dépendances:
-            return données
-        mu = soimême.générer_mu(dépendances)
+            return observées
+        mu = soimême.générer_mu(dépendances, groupes=groupes)
 
         ét = pm.HalfCauchy(name='ét_' + soimême.nom, beta=5)
         b = pm.Normal(
             name='b_' + soimême.nom, mu=0, sigma=100
         )
-        return pm.Normal(name=soimême.nom, mu=mu + b, sigma=ét, observed=données)
+        return pm.Normal(name=soimême.nom, mu=mu + b, sigma=ét, observed=observées, total_size=taille_totale)
 
-    def préparer_données(soimême, données: pd.Series):
-        return (données - données.mean()) / données.std()
+    def transformer(soimême, valeurs: pd.Series, référence: pd.Series):
+        return (valeurs - référence.mean()) / référence.std()
+
+    def paramètres_lien(soimême) -> list[str]:
+        return ['b_' + soimême.nom]
+
+    def espérance(soimême, mu: np.ndarray, paramètres: dict[str, np.ndarray]) -> np.ndarray:
+        b = paramètres['b_' + soimême.nom]
+        return mu + b.reshape(b.shape + (1,) * (mu.ndim - 1))
 
 
 class VariablePositive(VariableContinue):
     def __init__(soimême, nom):
         super().__init__(nom)
 
-    def générer_variable_pm(soimême, dépendances: dict[str, Any], données: Optional[pd.Series]):
+    def générer_variable_pm(
+            soimême,
+            dépendances: dict[str, Any],
+            données: Optional[pd.Series],
+            observées: Optional[Any] = None,
+            taille_totale: Optional[int] = None,
+            groupes: Optional[tuple[str, Any]] = None
+    ):
+        import pymc as pm
+
+        observées = données if observées is None else observées
         if not dépendances:
-            return données
-        mu = soimême.générer_mu(dépendances)
+            return observées
+        mu = soimême.générer_mu(dépendances, groupes=groupes)
 
         ét = pm.HalfCauchy(name='ét_' + soimême.nom, beta=5)
         b = pm.Normal(
             name='b_' + soimême.nom, sigma=100
         )
-        return pm.LogNormal(name=soimême.nom, mu=mu + b, sigma=ét, observed=données)
+        return pm.LogNormal(name=soimême.nom, mu=mu + b, sigma=ét, observed=observées, total_size=taille_totale)
+
+    def transformer(soimême, valeurs: pd.Series, référence: pd.Series):
+        return valeurs / référence.std() + 0.01
+
+    def paramètres_lien(soimême) -> list[str]:
+        return ['b_' + soimême.nom, 'ét_' + soimême.nom]
 
-    def préparer_données(soimême, données: pd.Series):
-        return données / données.std() + 0.01
+    def espérance(soimême, mu: np.ndarray, paramètres: dict[str, np.ndarray]) -> np.ndarray:
+        forme = (-1,) + (1,) * (mu.ndim - 1)
+        b = paramètres['b_' + soimême.nom].reshape(forme)
+        ét = paramètres['ét_' + soimême.nom].reshape(forme)
+        return np.exp(mu + b + ét ** 2 / 2)
 
 
 class VariableBornée(VariableContinue):
@@ -50,27 +86,49 @@ class VariableBornée(VariableContinue):
         super().__init__(nom)
         soimême._bornes = [minimum, maximum]
 
-    def générer_variable_pm(soimême, dépendances: dict[str, Any], données: Optional[pd.Series]):
+    def générer_variable_pm(
+            soimême,
+            dépendances: dict[str, Any],
+            données: Optional[pd.Series],
+            observées: Optional[Any] = None,
+            taille_totale: Optional[int] = None,
+            groupes: Optional[tuple[str, Any]] = None
+    ):
+        import pymc as pm
+
+        observées = données if observées is None else observées
         if not dépendances:
-            return données
-        mu = soimême.générer_mu(dépendances)
+            return observées
+        mu = soimême.générer_mu(dépendances, groupes=groupes)
 
         ét = pm.HalfCauchy(name='ét_' + soimême.nom, beta=5)
         b = pm.Normal(
             name='b_' + soimême.nom, mu=0, sigma=100
         )
-        return pm.LogitNormal(name=soimême.nom, mu=mu+b, sigma=ét, observed=données)
+        return pm.LogitNormal(name=soimême.nom, mu=mu+b, sigma=ét, observed=observées, total_size=taille_totale)
 
     def obt_bornes(soimême, données: Optional[pd.Series]) -> list[Number, Number]:
         minimum, maximum = soimême._bornes
         if données is not None:
-            minimum = min(données) if minimum is None else minimum
-            maximum = max(données) if maximum is None else maximum
+            minimum = données.min() if minimum is None else minimum
+            maximum = données.max() if maximum is None else maximum
         minimum = 0 if minimum is None else minimum
         maximum = 1 if maximum is None else maximum
         return minimum, maximum
 
-    def préparer_données(soimême, données: pd.Series):
-        bornes = soimême.obt_bornes(données)
-        données_ajustées = (données - bornes[0]) / (bornes[1] - bornes[0])
+    def transformer(soimême, valeurs: pd.Series, référence: pd.Series):
+        bornes = soimême.obt_bornes(référence)
+        données_ajustées = (valeurs - bornes[0]) / (bornes[1] - bornes[0])
         return données_ajustées * 0.99 + 0.005  # Pour éviter les problèmes avec le logit plus tard
+
+    def paramètres_lien(soimême) -> list[str]:
+        return ['b_' + soimême.nom, 'ét_' + soimême.nom]
+
+    def espérance(soimême, mu: np.ndarray, paramètres: dict[str, np.ndarray]) -> np.ndarray:
+        from scipy.special import expit
+
+        # L'espérance de la loi logit-normale n'a pas de forme analytique ; on utilise l'approximation probit
+        forme = (-1,) + (1,) * (mu.ndim - 1)
+        b = paramètres['b_' + soimême.nom].reshape(forme)
+        ét = paramètres['ét_' + soimême.nom].reshape(forme)
+        return expit((mu + b) / np.sqrt(1 + np.pi * ét ** 2 / 8))
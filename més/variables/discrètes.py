@@ -3,7 +3,6 @@ from typing import Optional, Any
 
 import numpy as np
 import pandas as pd
-import pymc as pm
 
 from .variable import Variable
 
@@ -13,28 +12,84 @@ class VariableÉchelle(Variable):
         super().__init__(nom)
         soimême.n_catégories = n_catégories
 
-    def générer_variable_pm(soimême, dépendances: dict[str, Any], données: Optional[pd.Series]):
+    def générer_variable_pm(
+            soimême,
+            dépendances: dict[str, Any],
+            données: Optional[pd.Series],
+            observées: Optional[Any] = None,
+            taille_totale: Optional[int] = None,
+            poids: Optional[np.ndarray] = None,
+            groupes: Optional[tuple[str, Any]] = None
+    ):
+        import pymc as pm
+
+        observées = données if observées is None else observées
         if not dépendances:
-            return données
-        mu = soimême.générer_mu(dépendances)
-        n_catégories = soimême.n_catégories or len(données.unique())
+            return observées
+        mu = soimême.générer_mu(dépendances, groupes=groupes)
+        n_catégories = soimême.n_catégories or len(np.unique(données))
 
         divisions = pm.Normal(
             name='divisions_' + soimême.nom, mu=np.arange(-1, n_catégories - 2), sigma=10, shape=n_catégories - 1,
             transform=pm.distributions.transforms.univariate_ordered
         )
-        return pm.OrderedLogistic(name=soimême.nom, cutpoints=divisions, eta=mu, observed=données, compute_p=False)
+        if poids is not None:
+            # Observations regroupées par motif unique : chaque vraisemblance est pondérée par le nombre de lignes
+            vraisemblance = pm.logp(
+                pm.OrderedLogistic.dist(cutpoints=divisions, eta=mu, compute_p=False), observées.astype(int)
+            )
+            return pm.Potential(soimême.nom, (poids * vraisemblance).sum())
+        return pm.OrderedLogistic(
+            name=soimême.nom, cutpoints=divisions, eta=mu, observed=observées, compute_p=False,
+            total_size=taille_totale
+        )
+
+    def paramètres_lien(soimême) -> list[str]:
+        return ['divisions_' + soimême.nom]
+
+    def espérance(soimême, mu: np.ndarray, paramètres: dict[str, np.ndarray]) -> np.ndarray:
+        from scipy.special import expit
+
+        # E[y] = somme des P(y > k) = somme des logit⁻¹(mu - division_k)
+        divisions = paramètres['divisions_' + soimême.nom]
+        divisions = divisions.reshape(divisions.shape[:1] + (1,) * (mu.ndim - 1) + divisions.shape[1:])
+        return expit(mu[..., None] - divisions).sum(axis=-1)
 
 
 class VariableBooléenne(VariableÉchelle):
-    def générer_variable_pm(soimême, dépendances: dict[str, Any], données: Optional[pd.Series]):
+    def générer_variable_pm(
+            soimême,
+            dépendances: dict[str, Any],
+            données: Optional[pd.Series],
+            observées: Optional[Any] = None,
+            taille_totale: Optional[int] = None,
+            poids: Optional[np.ndarray] = None,
+            groupes: Optional[tuple[str, Any]] = None
+    ):
+        import pymc as pm
+
+        observées = données if observées is None else observées
         if not dépendances:
-            return données
-        mu = soimême.générer_mu(dépendances)
+            return observées
+        mu = soimême.générer_mu(dépendances, groupes=groupes)
         b = pm.Normal(
             name='b_' + soimême.nom, mu=0, sigma=100
         )
-        return pm.Bernoulli(name=soimême.nom, logit_p=mu + b, observed=données)
+        if poids is not None:
+            # Avec les observations regroupées par motif unique, le nombre de succès suit une loi binomiale
+            return pm.Binomial(
+                name=soimême.nom, n=poids, logit_p=mu + b, observed=(observées * poids).astype(int)
+            )
+        return pm.Bernoulli(name=soimême.nom, logit_p=mu + b, observed=observées, total_size=taille_totale)
+
+    def paramètres_lien(soimême) -> list[str]:
+        return ['b_' + soimême.nom]
+
+    def espérance(soimême, mu: np.ndarray, paramètres: dict[str, np.ndarray]) -> np.ndarray:
+        from scipy.special import expit
+
+        b = paramètres['b_' + soimême.nom]
+        return expit(mu + b.reshape(b.shape + (1,) * (mu.ndim - 1)))
 
     def __init__(soimême, nom):
         super().__init__(nom, n_catégories=2)
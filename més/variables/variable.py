@@ -2,8 +2,8 @@ from __future__ import annotations
 
 from typing import Union, TYPE_CHECKING, Optional, Any
 
+import numpy as np
 import pandas as pd
-import pymc as pm
 
 from .relation import Relation
 from ..contexte import contexte
@@ -22,25 +22,98 @@ class Variable(object):
                 relation = Relation(indépendante=variable, dépendante=soimême)
                 mod.spécifier_relation(relation)
 
-    def générer_mu(soimême, dépendances: dict[str, Any]):
-        mu = None
-        for d in dépendances:
-            a = pm.Normal(
-                name=nom_coefficient_relation(d, soimême),
-                mu=0, sigma=100
-            )
+    def générer_mu(
+            soimême,
+            dépendances: dict[str, Any],
+            groupes: Optional[tuple[str, Any]] = None,
+            dim_sorties: Optional[str] = None
+    ):
+        import pymc as pm
+        import pytensor
+        import pytensor.tensor as pt
 
-            if mu is None:
-                mu = a * dépendances[d]
+        from .catégorique import ConceptionCatégorique
+
+        if not dépendances:
+            return None
+
+        modèle = pm.modelcontext(None)
+        sorties = () if dim_sorties is None else (dim_sorties,)
+        denses = [d for d, x in dépendances.items() if not isinstance(x, ConceptionCatégorique)]
+        catégoriques = [d for d, x in dépendances.items() if isinstance(x, ConceptionCatégorique)]
+        mu = 0
+
+        if denses:
+            # Les dépendances sont empilées dans une matrice de conception, avec un seul vecteur de coefficients
+            noms_coefficients = [nom_coefficient_relation(d, soimême) for d in denses]
+            dim = 'parents_' + soimême.nom
+            modèle.add_coord(dim, noms_coefficients)
+            coefficients = pm.Normal(name='coefs_' + soimême.nom, mu=0, sigma=100, dims=(dim, *sorties))
+            conception = pt.stack([pt.cast(dépendances[d], pytensor.config.floatX) for d in denses], axis=1)
+            for i, nom in enumerate(noms_coefficients):
+                pm.Deterministic(nom, coefficients[i], dims=sorties)
+
+            if groupes is None:
+                mu = mu + pt.dot(conception, coefficients)
             else:
-                mu = mu + a * dépendances[d]
+                dim_groupes, codes = groupes
+                coefficients_groupes = générer_décalages(
+                    coefficients, 'coefs_' + soimême.nom, (dim, *sorties), groupes
+                )
+                for i, nom in enumerate(noms_coefficients):
+                    pm.Deterministic(
+                        nom_coefficient_groupé(nom, dim_groupes), coefficients_groupes[:, i],
+                        dims=(dim_groupes, *sorties)
+                    )
+                termes = coefficients_groupes[codes]
+                mu = mu + (pt.shape_padright(conception, len(sorties)) * termes).sum(axis=1)
+
+        for d in catégoriques:
+            # Un coefficient par niveau de la variable catégorique, multiplié par sa matrice de conception creuse
+            conception = dépendances[d]
+            nom = nom_coefficient_relation(d, soimême)
+            coefficients = pm.Normal(name=nom, mu=0, sigma=100, dims=(conception.dim, *sorties))
+            if groupes is None:
+                mu = mu + conception.produit(coefficients)
+            else:
+                dim_groupes, codes = groupes
+                coefficients_groupes = générer_décalages(coefficients, nom, (conception.dim, *sorties), groupes)
+                pm.Deterministic(
+                    nom_coefficient_groupé(nom, dim_groupes), coefficients_groupes,
+                    dims=(dim_groupes, conception.dim, *sorties)
+                )
+                mu = mu + conception.produit_groupé(coefficients_groupes, codes)
 
         return mu
 
     def préparer_données(soimême, données: pd.Series):
-        return données
+        return soimême.transformer(données, données)
+
+    def transformer(soimême, valeurs: pd.Series, référence: pd.Series):
+        # Applique à des valeurs brutes (p. ex., un scénario) la transformation qui prépare les données `référence`
+        return valeurs
+
+    def paramètres_lien(soimême) -> list[str]:
+        # Paramètres du postérieur, autres que les coefficients des relations, nécessaires à `espérance`
+        return []
 
-    def générer_variable_pm(soimême, dépendances: dict[str, Any], données: Optional[pd.Series]):
+    def espérance(soimême, mu: np.ndarray, paramètres: dict[str, np.ndarray]) -> np.ndarray:
+        # Valeur attendue de la variable (sur l'échelle des données préparées) selon son prédicteur linéaire `mu`,
+        # de forme (tirage, ...), et les paramètres de sa fonction de lien pour les mêmes tirages
+        raise NotImplementedError()
+
+    def configuration(soimême) -> dict[str, Any]:
+        return {"classe": type(soimême).__name__, **vars(soimême)}
+
+    def générer_variable_pm(
+            soimême,
+            dépendances: dict[str, Any],
+            données: Optional[pd.Series],
+            observées: Optional[Any] = None,
+            taille_totale: Optional[int] = None,
+            poids: Optional[Any] = None,
+            groupes: Optional[tuple[str, Any]] = None
+    ):
         raise NotImplementedError()
 
     def __str__(soimême):
@@ -49,3 +122,17 @@ class Variable(object):
 
 def nom_coefficient_relation(indépendant: Variable, dépendant: Variable) -> str:
     return 'rel_' + str(indépendant) + '_envers_' + str(dépendant)
+
+
+def générer_décalages(coefficients, nom: str, dims: tuple[str, ...], groupes: tuple[str, Any]):
+    import pymc as pm
+
+    # Décalages par groupe (p. ex., région) partiellement mis en commun autour des coefficients globaux
+    dim_groupes = groupes[0]
+    ét = pm.HalfNormal(name='ét_' + nom, sigma=1, dims=dims)
+    décalages = pm.Normal(name='décalages_' + nom, mu=0, sigma=1, dims=(dim_groupes, *dims))
+    return coefficients + ét * décalages
+
+
+def nom_coefficient_groupé(coefficient: str, dim: str) -> str:
+    return coefficient + '_' + dim
@@ -0,0 +1,77 @@
+import arviz as az
+import numpy as np
+
+from més.effets import calculer_effets, résumer_distribution
+from més.graphe import GrapheCausal
+from més.variables import Relation
+from més.variables.variable import nom_coefficient_relation
+
+# Petit graphe acyclique avec plusieurs cheminements de a à d : a->b->d, a->b->c->d et a->c->d
+RELATIONS = [("a", "b"), ("a", "c"), ("b", "c"), ("b", "d"), ("c", "d")]
+N_CHAÎNES, N_TIRAGES = 2, 50
+
+
+def graphe_test() -> GrapheCausal:
+    return GrapheCausal([Relation(de, à) for de, à in RELATIONS], résoudre=lambda v: v)
+
+
+def trace_test(graphe: GrapheCausal) -> az.InferenceData:
+    rng = np.random.default_rng(0)
+    return az.from_dict(posterior={
+        nom_coefficient_relation(de, à): rng.normal(size=(N_CHAÎNES, N_TIRAGES)) for de, à in graphe.relations
+    })
+
+
+def somme_cheminements(trace: az.InferenceData, graphe: GrapheCausal, de: str, à: str) -> np.ndarray:
+    somme = np.zeros((N_CHAÎNES, N_TIRAGES))
+    for cheminement in graphe.cheminements(de, à):
+        produit = np.ones((N_CHAÎNES, N_TIRAGES))
+        for x, y in zip(cheminement[:-1], cheminement[1:]):
+            produit = produit * trace.posterior[nom_coefficient_relation(x, y)].values
+        somme += produit
+    return somme
+
+
+def test_effets_totaux_égaux_à_la_somme_des_cheminements():
+    graphe = graphe_test()
+    trace = trace_test(graphe)
+    effets = calculer_effets(trace, graphe)
+
+    assert len(graphe.cheminements("a", "d")) == 3
+    for de in graphe.variables:
+        for à in graphe.variables:
+            if de == à:
+                continue
+            i, j = graphe.index[de], graphe.index[à]
+            attendu = somme_cheminements(trace, graphe, de, à)
+            np.testing.assert_allclose(effets["totaux"][..., i, j], attendu, atol=1e-10)
+            np.testing.assert_allclose(
+                effets["directs"][..., i, j] + effets["indirects"][..., i, j], attendu, atol=1e-10
+            )
+
+
+def test_effets_directs():
+    graphe = graphe_test()
+    trace = trace_test(graphe)
+    effets = calculer_effets(trace, graphe)
+
+    for de, à in graphe.relations:
+        np.testing.assert_array_equal(
+            effets["directs"][..., graphe.index[de], graphe.index[à]],
+            trace.posterior[nom_coefficient_relation(de, à)].values
+        )
+    # Aucune relation de d envers a
+    assert not effets["totaux"][..., graphe.index["d"], graphe.index["a"]].any()
+
+
+def test_résumer_distribution():
+    valeurs = np.array([3., 100., 0., 2., 4., 1.])
+    résumé = résumer_distribution(valeurs.copy(), quantiles=(0.5,), prob_hdi=0.5)
+
+    assert résumé["moyenne"] == valeurs.mean()
+    assert résumé["ét"] == valeurs.std()
+    assert résumé["quantiles"] == {0.5: 2.5}
+    assert résumé["prob_positif"] == 5 / 6
+    # L'intervalle le plus étroit contenant 3 des 6 valeurs exclut la valeur aberrante
+    assert résumé["hdi"] == (0., 2.)
+    assert résumer_distribution(valeurs.copy(), prob_hdi=0.8)["hdi"] == (0., 3.)
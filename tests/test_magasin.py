@@ -0,0 +1,30 @@
+import os
+
+from més.magasin import MagasinCalibrations
+
+
+def test_nettoyer_magasin(tmp_path):
+    dossier = str(tmp_path)
+    magasin = MagasinCalibrations(dossier)
+
+    def fichier(nom: str) -> str:
+        chemin = os.path.join(dossier, nom)
+        with open(chemin, 'w') as d:
+            d.write('')
+        return chemin
+
+    gardé = fichier("a.ncdf")
+    prédictions = fichier("a.prédictions.ncdf")
+    retiré = fichier("b.ncdf")
+    orphelin = fichier("c.ncdf")
+    magasin.enregistrer("a", gardé, {"modèle": "m", "données": "d"})
+    magasin.enregistrer("b", retiré, {"modèle": "m", "données": "d"})
+    magasin.enregistrer("disparu", os.path.join(dossier, "disparu.ncdf"), {"modèle": "m", "données": "d"})
+
+    effacés = magasin.nettoyer(garder=["a"])
+
+    assert sorted(effacés) == sorted([retiré, orphelin])
+    assert os.path.isfile(gardé) and os.path.isfile(prédictions)
+    assert not os.path.isfile(retiré) and not os.path.isfile(orphelin)
+    assert list(magasin.chercher()) == ["a"]
+    assert magasin.obtenir("a")["fichier"] == "a.ncdf"
@@ -0,0 +1,78 @@
+import numpy as np
+
+from més.scénarios import paramètres_nécessaires, propager_scénarios
+from més.variables import VariableContinue, VariablePositive
+from més.variables.variable import nom_coefficient_relation
+
+N_LIGNES, N_TIRAGES = 20, 30
+
+
+def modèle_test(z):
+    # x -> y -> z et x -> z
+    x, y = VariableContinue("x"), VariableContinue("y")
+    return [x, y, z], {"x": [], "y": [x], "z": [x, y]}
+
+
+def entrées_test(ordre, parents, scénarios: list[tuple[float, np.ndarray]]):
+    # Chaque scénario ajoute `delta` aux valeurs de x sur les lignes de son masque ; le scénario 0 est la base
+    rng = np.random.default_rng(0)
+    valeurs = {str(v): rng.normal(size=N_LIGNES) for v in ordre}
+    n_scénarios = len(scénarios) + 1
+    masques = np.zeros((n_scénarios, N_LIGNES), dtype=bool)
+    imposées = np.repeat(valeurs["x"][None], n_scénarios, axis=0)
+    for s, (delta, masque) in enumerate(scénarios, start=1):
+        masques[s, masque] = True
+        imposées[s, masque] += delta
+
+    à_propager = {"y", "z"}
+    paramètres = {
+        n: rng.normal(size=N_TIRAGES) if n.startswith("rel_") or n.startswith("b_") else rng.uniform(0.1, 1, N_TIRAGES)
+        for n in paramètres_nécessaires([v for v in ordre if str(v) in à_propager], parents)
+    }
+    return dict(
+        ordre=ordre, parents=parents, à_propager=à_propager, valeurs=valeurs, fixées={"x": (masques, imposées)},
+        paramètres=paramètres, n_scénarios=n_scénarios, n_tirages=N_TIRAGES
+    )
+
+
+def test_delta_nul_sans_effet():
+    ordre, parents = modèle_test(VariablePositive("z"))
+    entrées = entrées_test(ordre, parents, [(0., np.ones(N_LIGNES, dtype=bool))])
+
+    effets = propager_scénarios(**entrées)
+
+    assert set(effets) == {"x", "y", "z"}
+    for v, effet in effets.items():
+        assert effet.shape == (1, N_TIRAGES)
+        np.testing.assert_array_equal(effet, 0)
+
+
+def test_linéaire_analytique():
+    ordre, parents = modèle_test(VariableContinue("z"))
+    x, y, z = ordre
+    masque = np.arange(N_LIGNES) < N_LIGNES // 4
+    entrées = entrées_test(ordre, parents, [(2., np.ones(N_LIGNES, dtype=bool)), (-1., masque)])
+    p = entrées["paramètres"]
+    a, b, c = p[nom_coefficient_relation(x, y)], p[nom_coefficient_relation(y, z)], p[nom_coefficient_relation(x, z)]
+
+    effets = propager_scénarios(**entrées)
+
+    # Effet moyen sur toutes les lignes : delta × fraction des lignes touchées × somme des produits des cheminements
+    for s, (delta, fraction) in enumerate([(2., 1.), (-1., 0.25)]):
+        np.testing.assert_allclose(effets["x"][s], delta * fraction)
+        np.testing.assert_allclose(effets["y"][s], delta * fraction * a)
+        np.testing.assert_allclose(effets["z"][s], delta * fraction * (c + a * b))
+
+    # Le découpage en blocs de tirages ne change pas le résultat
+    for v, effet in propager_scénarios(**entrées, taille_bloc=1).items():
+        np.testing.assert_allclose(effet, effets[v])
+
+
+def test_lignes():
+    ordre, parents = modèle_test(VariableContinue("z"))
+    masque = np.arange(N_LIGNES) < N_LIGNES // 4
+    entrées = entrées_test(ordre, parents, [(3., masque)])
+
+    # Moyenne sur les seules lignes touchées par l'intervention
+    effets = propager_scénarios(**entrées, lignes=np.flatnonzero(masque))
+    np.testing.assert_allclose(effets["x"], 3.)